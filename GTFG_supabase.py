@@ -1,83 +1,68 @@
 import pandas as pd
 import requests
 import zipfile
-import io
 import streamlit as st
 from datetime import datetime, time
 import pytz
-import psycopg2
-from psycopg2.extras import execute_values
+from sqlalchemy import text
 
-# --- PostgreSQL Connection ---
-PG_HOST = "eegejlqdgahlmtjniupz.supabase.co"
-PG_PORT = 5432
-PG_DB = "postgres"
-PG_USER = "postgres"
-PG_PASSWORD = "Supa1base!"  # Enter your actual DB password here
+import db
+import gtfs_cache
+import gtfs_download
+import gtfs_pg_loader
+import regions
 
 # --- GTFS Static Data URL ---
-GTFS_ZIP_URL = "https://www.data.qld.gov.au/dataset/general-transit-feed-specification-gtfs-translink/resource/e43b6b9f-fc2b-4630-a7c9-86dd5483552b/download"
-
-def get_pg_connection():
-    return psycopg2.connect(
-        host=PG_HOST,
-        port=PG_PORT,
-        dbname=PG_DB,
-        user=PG_USER,
-        password=PG_PASSWORD,
-        sslmode="require"
-    )
-
-def download_gtfs():
+GTFS_ZIP_URL = gtfs_download.GTFS_ZIP_URL
+
+def download_gtfs(conditional=True):
     try:
-        response = requests.get(GTFS_ZIP_URL, timeout=10)
-        response.raise_for_status()
-        return zipfile.ZipFile(io.BytesIO(response.content))
+        return gtfs_download.download_feed(GTFS_ZIP_URL, conditional=conditional)
     except requests.RequestException as e:
         st.error(f"Error downloading GTFS data: {e}")
         return None
 
 def extract_file(zip_obj, filename):
     try:
-        with zip_obj.open(filename) as file:
-            return pd.read_csv(file, dtype=str, low_memory=False)
+        return gtfs_cache.read_table(zip_obj, filename, storage=True)
     except Exception as e:
         st.warning(f"Could not read {filename}: {e}")
         return pd.DataFrame()
 
-def classify_region(lat, lon):
-    lat, lon = float(lat), float(lon)
-    if -28.2 <= lat <= -27.8 and 153.2 <= lon <= 153.5:
-        return "Gold Coast"
-    elif -27.7 <= lat <= -27.2 and 152.8 <= lon <= 153.5:
-        return "Brisbane"
-    elif -27.2 <= lat <= -26.3 and 152.8 <= lon <= 153.3:
-        return "Sunshine Coast"
-    else:
-        return "Other"
+def store_to_postgres(tables):
+    """Apply only the changed rows of every table in a single transaction.
+
+    Returns True only if every table was read and stored.
+    """
+    stored = {table_name: df for table_name, df in tables.items() if not df.empty}
+    if not stored:
+        return False
 
-def store_to_postgres(table_name, df):
-    if df.empty:
-        return
+    try:
+        with db.get_database().raw_connection() as conn:
+            counts = gtfs_pg_loader.store_feed_delta(conn, stored)
+        for table_name, delta in counts.items():
+            st.success(
+                f"{table_name} updated: {delta['inserted']} inserted, "
+                f"{delta['updated']} updated, {delta['deleted']} deleted."
+            )
+    except Exception as e:
+        st.error(f"Failed to update GTFS tables, no changes applied: {e}")
+        return False
+    return len(stored) == len(tables)
 
-    conn = get_pg_connection()
-    cursor = conn.cursor()
+def bulk_load_to_postgres(zip_path):
+    """COPY every table straight from the ZIP into staging tables and swap them in."""
     try:
-        cursor.execute(f"DELETE FROM {table_name};")
-        columns = list(df.columns)
-        values = df[columns].values.tolist()
-        insert_query = f"INSERT INTO {table_name} ({','.join(columns)}) VALUES %s"
-        execute_values(cursor, insert_query, values)
-        conn.commit()
-        st.success(f"{table_name} updated.")
+        with db.get_database().raw_connection() as conn:
+            gtfs_pg_loader.bulk_load_feed(conn, zip_path)
+        st.success("GTFS tables bulk loaded and swapped in.")
     except Exception as e:
-        st.error(f"Failed to update {table_name}: {e}")
-        conn.rollback()
-    finally:
-        cursor.close()
-        conn.close()
+        st.error(f"Bulk load failed, live tables unchanged: {e}")
+        return False
+    return True
 
-def load_gtfs_data(force_refresh=False):
+def load_gtfs_data(force_refresh=False, bulk=False):
     if "last_refresh" not in st.session_state:
         st.session_state.last_refresh = None
 
@@ -86,25 +71,40 @@ def load_gtfs_data(force_refresh=False):
     refresh_time = datetime.combine(now.date(), time(1, 0), tzinfo=brisbane_tz)
 
     if force_refresh or st.session_state.last_refresh is None or (now > refresh_time and st.session_state.last_refresh < refresh_time):
-        zip_obj = download_gtfs()
-        if not zip_obj:
+        download = download_gtfs(conditional=not force_refresh)
+        if not download:
+            return
+        # Skip only feeds that were loaded successfully, so a failed load is retried;
+        # a forced refresh always reloads
+        if not force_refresh and gtfs_download.already_loaded(download):
+            st.session_state.last_refresh = now
+            st.info("GTFS feed has not changed since the last load.")
             return
 
-        routes_df = extract_file(zip_obj, "routes.txt")
-        stops_df = extract_file(zip_obj, "stops.txt")
-        trips_df = extract_file(zip_obj, "trips.txt")
-        stop_times_df = extract_file(zip_obj, "stop_times.txt")
-        shapes_df = extract_file(zip_obj, "shapes.txt")
-
-        stops_df["stop_lat"] = stops_df["stop_lat"].astype(float)
-        stops_df["stop_lon"] = stops_df["stop_lon"].astype(float)
-        stops_df["region"] = stops_df.apply(lambda row: classify_region(row["stop_lat"], row["stop_lon"]), axis=1)
+        if bulk:
+            if bulk_load_to_postgres(download.path):
+                gtfs_download.mark_loaded(download)
+            st.session_state.last_refresh = now
+            return
 
-        store_to_postgres("gtfs_routes", routes_df)
-        store_to_postgres("gtfs_stops", stops_df)
-        store_to_postgres("gtfs_trips", trips_df)
-        store_to_postgres("gtfs_stop_times", stop_times_df)
-        store_to_postgres("gtfs_shapes", shapes_df)
+        with zipfile.ZipFile(download.path) as zip_obj:
+            routes_df = extract_file(zip_obj, "routes.txt")
+            stops_df = extract_file(zip_obj, "stops.txt")
+            trips_df = extract_file(zip_obj, "trips.txt")
+            stop_times_df = extract_file(zip_obj, "stop_times.txt")
+            shapes_df = extract_file(zip_obj, "shapes.txt")
+
+        stops_df["region"] = regions.classify_points(stops_df["stop_lat"], stops_df["stop_lon"])
+
+        stored = store_to_postgres({
+            "gtfs_routes": routes_df,
+            "gtfs_stops": stops_df,
+            "gtfs_trips": trips_df,
+            "gtfs_stop_times": stop_times_df,
+            "gtfs_shapes": shapes_df,
+        })
+        if stored:
+            gtfs_download.mark_loaded(download)
 
         st.session_state.last_refresh = now
     else:
@@ -112,9 +112,8 @@ def load_gtfs_data(force_refresh=False):
 
 def show_preview_from_postgres(table_name):
     try:
-        conn = get_pg_connection()
-        df = pd.read_sql(f"SELECT * FROM {table_name} LIMIT 5", conn)
-        conn.close()
+        with db.get_database().connect() as conn:
+            df = pd.read_sql(text(f"SELECT * FROM {table_name} LIMIT 5"), conn)
         st.subheader(f"{table_name} (latest 5 rows)")
         st.dataframe(df)
     except Exception as e:
@@ -123,11 +122,20 @@ def show_preview_from_postgres(table_name):
 # --- Streamlit App ---
 st.title("GTFS Data Loader")
 
+load_mode = st.radio("Load mode", ["Incremental (changed rows only)", "Bulk (COPY and table swap)"])
+bulk = load_mode.startswith("Bulk")
+
 if st.button("Download Now"):
-    load_gtfs_data(force_refresh=True)
+    load_gtfs_data(force_refresh=True, bulk=bulk)
 else:
-    load_gtfs_data(force_refresh=False)
+    load_gtfs_data(force_refresh=False, bulk=bulk)
 
 # --- Show Latest Preview from DB ---
 for table in ["gtfs_routes", "gtfs_stops", "gtfs_trips", "gtfs_stop_times", "gtfs_shapes"]:
     show_preview_from_postgres(table)
+
+with st.expander("Database pool"):
+    try:
+        st.json(db.get_database().metrics())
+    except RuntimeError as e:
+        st.error(str(e))
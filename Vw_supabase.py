@@ -1,47 +1,28 @@
 import streamlit as st
-import pandas as pd
 import folium
 from streamlit_folium import folium_static
-from sqlalchemy import create_engine
 from gtfs_realtime import get_vehicle_updates
 
-# --- Configuration ---
-SUPABASE_URL = st.secrets.get("SUPABASE_URL")
-SEQ_VIEW_NAME = "seq_gtfs_static"
+import db
+import gtfs_queries
+import gtfs_shapes
+import rt_render
 
-# --- Get SQLAlchemy engine ---
-def get_sqlalchemy_engine():
+# --- Get pooled database ---
+def get_database():
     try:
-        return create_engine(SUPABASE_URL)
+        return db.get_database()
     except Exception as e:
         st.error(f"Database connection error: {e}")
         return None
 
-# --- Load GTFS view data from Supabase ---
-@st.cache_data(show_spinner=False)
-def load_seq_gtfs_static():
-    engine = get_sqlalchemy_engine()
-    if engine is None:
-        return pd.DataFrame()
-    try:
-        df = pd.read_sql(f"SELECT * FROM {SEQ_VIEW_NAME}", con=engine)
-        df["shape_pt_lat"] = df["shape_pt_lat"].astype(float)
-        df["shape_pt_lon"] = df["shape_pt_lon"].astype(float)
-        df["shape_pt_sequence"] = df["shape_pt_sequence"].astype(int)
-        return df
-    except Exception as e:
-        st.error(f"Failed to load data from {SEQ_VIEW_NAME}: {e}")
-        return pd.DataFrame()
-
-# --- Get shapes for a route and direction ---
-def get_route_shapes(route_id, direction_id, shapes_df):
-    route_shapes = shapes_df[
-        (shapes_df["route_id"] == route_id) &
-        (shapes_df["direction_id"] == str(direction_id))
-    ]
-    return route_shapes.sort_values(by=["shape_id", "shape_pt_sequence"]) if not route_shapes.empty else pd.DataFrame()
+# --- Get shapes for a route and direction (queried per route, LRU-cached) ---
+def get_route_shapes(route_id, direction_id):
+    return gtfs_queries.fetch_route_shapes(route_id, direction_id)
 
 # --- Plot map ---
+STATUS_COLORS = {"On Time": "green", "Delayed": "orange"}
+
 def plot_map(vehicles_df, route_shapes=None):
     if vehicles_df.empty:
         map_center = [-27.5, 153.0]
@@ -50,30 +31,35 @@ def plot_map(vehicles_df, route_shapes=None):
 
     m = folium.Map(location=map_center, zoom_start=12)
 
-    # Vehicle markers
-    for _, row in vehicles_df.iterrows():
-        color = "green" if row["status"] == "On Time" else "orange" if row["status"] == "Delayed" else "red"
-        folium.Marker(
-            location=[row["lat"], row["lon"]],
-            icon=folium.Icon(color=color, icon="bus", prefix="fa"),
-            popup=f"Vehicle {row['vehicle_id']} on Route {row['route_id']}"
-        ).add_to(m)
-        folium.Marker(
-            location=[row["lat"], row["lon"]],
-            icon=folium.DivIcon(html=f'<div style="font-size: 12px; font-weight: bold; color: black;">{row["vehicle_id"]} - stop {row["Stop Sequence"]}</div>')
+    # Route polylines, all shapes in one GeoJSON layer, simplified for the view that fits them
+    if route_shapes is not None and not route_shapes.empty:
+        zoom = gtfs_shapes.zoom_for_bounds(route_shapes["shape_pt_lat"], route_shapes["shape_pt_lon"])
+        route_shapes = gtfs_shapes.simplify_shapes(route_shapes, gtfs_shapes.tolerance_for_zoom(zoom))
+        m.fit_bounds([
+            [route_shapes["shape_pt_lat"].min(), route_shapes["shape_pt_lon"].min()],
+            [route_shapes["shape_pt_lat"].max(), route_shapes["shape_pt_lon"].max()],
+        ])
+        folium.GeoJson(
+            rt_render.shapes_geojson(route_shapes),
+            name="Route shapes",
+            style_function=lambda feature: {"color": "red", "weight": 3},
+            tooltip=folium.GeoJsonTooltip(fields=["shape_id"], aliases=["Shape"]),
         ).add_to(m)
 
-    # Route polylines
-    if route_shapes is not None and not route_shapes.empty:
-        for shape_id, group in route_shapes.groupby("shape_id"):
-            coords = group[["shape_pt_lat", "shape_pt_lon"]].values.tolist()
-            if coords:
-                folium.PolyLine(
-                    locations=coords,
-                    color="red",
-                    weight=3,
-                    tooltip=f"Shape {shape_id}"
-                ).add_to(m)
+    # Vehicle markers, all vehicles in one GeoJSON layer
+    if not vehicles_df.empty:
+        vehicles = vehicles_df.assign(
+            color=vehicles_df["status"].map(STATUS_COLORS).fillna("red"),
+            label=vehicles_df["vehicle_id"].astype(str) + " - stop " + vehicles_df["Stop Sequence"].astype(str),
+        )
+        folium.GeoJson(
+            rt_render.points_geojson(vehicles, ["vehicle_id", "route_id", "color", "label"]),
+            name="Vehicles",
+            marker=folium.CircleMarker(radius=7, fill=True, fill_opacity=0.9),
+            style_function=lambda feature: {"color": feature["properties"]["color"], "fillColor": feature["properties"]["color"]},
+            tooltip=folium.GeoJsonTooltip(fields=["label"], labels=False),
+            popup=folium.GeoJsonPopup(fields=["vehicle_id", "route_id"], aliases=["Vehicle", "Route"]),
+        ).add_to(m)
 
     folium_static(m)
 
@@ -82,7 +68,6 @@ st.set_page_config(layout="wide")
 st.title("GTFS Realtime Vehicle & Route Viewer")
 
 # --- Load data ---
-shapes_view_df = load_seq_gtfs_static()
 vehicles_df = get_vehicle_updates()
 
 # --- Initialise session state ---
@@ -130,7 +115,7 @@ else:
         st.warning(f"No vehicles currently active on route {st.session_state.selected_route}")
         plot_map(filtered_vehicles)
     else:
-        directions = shapes_view_df[shapes_view_df["route_id"] == route_id]["direction_id"].unique()
+        directions = gtfs_queries.fetch_route_directions(route_id)
         if len(directions) > 0:
             selected_direction = st.sidebar.radio(
                 "Select Direction",
@@ -138,7 +123,7 @@ else:
                 format_func=lambda d: "Outbound" if d == "0" else "Inbound"
             )
             filtered_vehicles = filtered_vehicles[filtered_vehicles["direction_id"] == selected_direction]
-            route_shapes = get_route_shapes(route_id, selected_direction, shapes_view_df)
+            route_shapes = get_route_shapes(route_id, selected_direction)
             plot_map(filtered_vehicles, route_shapes)
         else:
             st.warning("No direction info available for this route.")
@@ -151,3 +136,8 @@ if st.sidebar.button("🔄 Refresh Data"):
 # --- Data Table ---
 st.write("Vehicle Data:")
 st.dataframe(filtered_vehicles if st.session_state.selected_route != "All Routes" else display_df)
+
+with st.sidebar.expander("Database pool"):
+    database = get_database()
+    if database is not None:
+        st.json(database.metrics())
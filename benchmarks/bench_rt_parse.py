@@ -0,0 +1,138 @@
+"""Benchmark GTFS-RT decoding: rt_pipeline's columnar parsers against the old dict-per-row parser.
+
+Record the live SEQ feeds once, then benchmark against the recording:
+
+    python -m benchmarks.bench_rt_parse --record benchmarks/fixtures
+    python -m benchmarks.bench_rt_parse --fixtures benchmarks/fixtures
+
+or use a synthetic feed of a given fleet size:
+
+    python -m benchmarks.bench_rt_parse --synthetic 5000
+
+Peak memory is measured with tracemalloc, which sees Python and NumPy
+allocations but not protobuf's native buffers.
+"""
+import argparse
+import os
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from google.transit import gtfs_realtime_pb2
+
+import rt_fetch
+import rt_pipeline
+import rt_stop_updates
+from benchmarks import synthetic
+
+
+def legacy_parse_trip_updates(content):
+    """The pre-stop-level parser: only the first StopTimeUpdate delay of every TripUpdate."""
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(content)
+
+    trip_updates = [
+        entity.trip_update for entity in feed.entity
+        if entity.HasField("trip_update") and entity.trip_update.stop_time_update
+    ]
+    n = len(trip_updates)
+    trip_id = np.empty(n, dtype=object)
+    delay = np.empty(n, dtype=np.int32)
+
+    for i, tu in enumerate(trip_updates):
+        trip_id[i] = tu.trip.trip_id
+        delay[i] = tu.stop_time_update[0].arrival.delay
+
+    return pd.DataFrame({"trip_id": trip_id, "delay": delay, "status": rt_pipeline.delay_status(delay)})
+
+
+def legacy_parse_vehicle_positions(content):
+    """The pre-columnar parser: one dict and one strftime per vehicle."""
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(content)
+
+    vehicles = []
+    for entity in feed.entity:
+        if entity.HasField("vehicle"):
+            v = entity.vehicle
+            vehicles.append({
+                "trip_id": v.trip.trip_id,
+                "route_id": v.trip.route_id,
+                "vehicle_id": v.vehicle.label,
+                "lat": v.position.latitude,
+                "lon": v.position.longitude,
+                "stop_sequence": v.current_stop_sequence,
+                "stop_id": v.stop_id,
+                "current_status": v.current_status,
+                "timestamp": datetime.fromtimestamp(v.timestamp, rt_pipeline.BRISBANE_TZ).strftime('%Y-%m-%d %H:%M:%S %Z') if v.HasField("timestamp") else "N/A"
+            })
+    return pd.DataFrame(vehicles)
+
+
+def measure(parse, content, repeat):
+    """Return (median seconds, peak traced bytes, rows) for parsing `content`."""
+    parse(content)  # warm up imports and caches
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parse(content)
+        times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    rows = len(parse(content))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak, rows
+
+
+def record(directory, modes):
+    """Save the current live feeds as <FeedType>_<Mode>.pb."""
+    os.makedirs(directory, exist_ok=True)
+    for mode in modes:
+        for feed_type in (rt_fetch.VEHICLE_POSITIONS, rt_fetch.TRIP_UPDATES):
+            path = os.path.join(directory, f"{feed_type}_{mode}.pb")
+            with open(path, "wb") as f:
+                f.write(rt_fetch.fetch(rt_fetch.feed_url(feed_type, mode)))
+            print(f"recorded {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--fixtures", help="directory with recorded VehiclePositions_Bus.pb / TripUpdates_Bus.pb")
+    source.add_argument("--synthetic", type=int, metavar="N", help="generate a feed with N vehicles")
+    source.add_argument("--record", metavar="DIR", help="record the live feeds into DIR and exit")
+    parser.add_argument("--mode", default="Bus")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, [args.mode])
+        return
+
+    if args.synthetic:
+        vehicle_content = synthetic.vehicle_positions_feed(args.synthetic)
+        trip_content = synthetic.trip_updates_feed(args.synthetic)
+    else:
+        with open(os.path.join(args.fixtures, f"{rt_fetch.VEHICLE_POSITIONS}_{args.mode}.pb"), "rb") as f:
+            vehicle_content = f.read()
+        with open(os.path.join(args.fixtures, f"{rt_fetch.TRIP_UPDATES}_{args.mode}.pb"), "rb") as f:
+            trip_content = f.read()
+
+    cases = [
+        ("vehicle_positions (legacy dicts)", legacy_parse_vehicle_positions, vehicle_content),
+        ("vehicle_positions (columnar)", rt_pipeline.parse_vehicle_positions, vehicle_content),
+        ("trip_updates (first stop only)", legacy_parse_trip_updates, trip_content),
+        ("stop_time_updates (sorted)", lambda c: rt_stop_updates.parse_stop_time_updates([c]).keys, trip_content),
+    ]
+    print(f"{'parser':<34} {'rows':>7} {'median ms':>10} {'rows/s':>12} {'peak KiB':>10}")
+    for name, parse, content in cases:
+        seconds, peak, rows = measure(parse, content, args.repeat)
+        print(f"{name:<34} {rows:>7} {seconds * 1000:>10.2f} {rows / seconds:>12,.0f} {peak / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""End-to-end benchmarks for the static ETL and realtime refresh stages.
+
+Run every stage on synthetic feeds at 1x, 5x and 20x SEQ scale:
+
+    python -m benchmarks.run
+
+or on recorded feeds (scaled up with replay_server.scale_feed) and the real static ZIP:
+
+    python -m benchmarks.run --fixtures benchmarks/fixtures --static-zip gtfs.zip
+
+Store the results as the baseline, then compare later runs against it;
+--compare exits non-zero when a stage is slower than the baseline by more
+than --threshold:
+
+    python -m benchmarks.run --save-baseline
+    python -m benchmarks.run --compare
+
+Each stage runs in a fresh process. Its memory column is the peak one
+run adds on top of what the process holds after setup: the RSS
+high-water mark (reset through /proc/self/clear_refs) on Linux,
+tracemalloc elsewhere. The store_to_postgres stage writes to the gtfs_*
+tables and only runs with --dsn; point it at a scratch database.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from typing import Callable, NamedTuple
+
+import psycopg2
+
+import gtfs_cache
+import gtfs_index
+import gtfs_pg_loader
+import gtfs_routes
+import gtfs_shapes
+import regions
+import replay_server
+import rt_fetch
+import rt_pipeline
+from benchmarks import synthetic
+
+SCALES = (1, 5, 20)
+# Synthetic vehicles at 1x, about the SEQ bus fleet on the road at peak
+BASE_VEHICLES = 1500
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+# Slowdown against the baseline reported as a regression
+REGRESSION_THRESHOLD = 0.2
+
+
+class Stage(NamedTuple):
+    name: str
+    # "static" or "realtime": which inputs the stage reads
+    kind: str
+    # (inputs) -> argument for run; not timed
+    setup: Callable
+    # (argument) -> rows processed; timed
+    run: Callable
+
+
+# --- Static ETL stages ---
+
+def _read_tables(inputs, storage=False):
+    with zipfile.ZipFile(inputs["static_zip"]) as zip_obj:
+        tables = {filename: gtfs_cache.read_table(zip_obj, filename, storage) for filename in gtfs_cache.GTFS_TABLES}
+    stops = tables["stops.txt"]
+    stops["region"] = regions.classify_points(stops["stop_lat"], stops["stop_lon"])
+    return tables
+
+
+def _extract_files(zip_path):
+    with zipfile.ZipFile(zip_path) as zip_obj:
+        return sum(len(gtfs_cache.read_table(zip_obj, filename)) for filename in gtfs_cache.GTFS_TABLES)
+
+
+def _classify_regions(stops):
+    return len(regions.classify_points(stops["stop_lat"], stops["stop_lon"]))
+
+
+def _index_setup(inputs):
+    tables = _read_tables(inputs)
+    return tables, gtfs_index.build_feed_index(tables["stops.txt"], tables["trips.txt"], tables["stop_times.txt"])
+
+
+def _build_index(tables):
+    gtfs_index.build_feed_index(tables["stops.txt"], tables["trips.txt"], tables["stop_times.txt"])
+    return len(tables["stop_times.txt"])
+
+
+def _route_directions(feed_index):
+    return [(route_id, direction) for route_id, directions in feed_index.directions_by_route.items() for direction in directions]
+
+
+def _route_shapes_setup(inputs):
+    tables, feed_index = _index_setup(inputs)
+    return feed_index, gtfs_shapes.build_shape_lods(tables["shapes.txt"])
+
+
+def _route_shapes(arg):
+    """gtfs_routes.get_route_shapes for every route and direction."""
+    feed_index, shape_lods = arg
+    return sum(
+        len(gtfs_routes.get_route_shapes(route_id, direction, feed_index, shape_lods)[0])
+        for route_id, direction in _route_directions(feed_index)
+    )
+
+
+def _route_stops(arg):
+    """gtfs_routes.get_route_stops for every route and direction."""
+    tables, feed_index = arg
+    return sum(
+        len(gtfs_routes.get_route_stops(route_id, direction, feed_index, tables["stops.txt"]))
+        for route_id, direction in _route_directions(feed_index)
+    )
+
+
+def _store_setup(inputs):
+    tables = _read_tables(inputs, storage=True)
+    conn = psycopg2.connect(inputs["dsn"])
+    return conn, {table_name: tables[filename] for table_name, filename in gtfs_pg_loader.TABLE_FILES.items()}
+
+
+def _store(arg):
+    """GTFG_supabase.store_to_postgres: the delta load of every table."""
+    conn, tables = arg
+    gtfs_pg_loader.store_feed_delta(conn, tables)
+    return sum(len(df) for df in tables.values())
+
+
+# --- Realtime refresh stages ---
+
+def _parse_vehicle_positions(content):
+    return len(rt_pipeline.parse_vehicle_positions(content))
+
+
+def _live_snapshot_setup(inputs):
+    return {
+        (rt_fetch.VEHICLE_POSITIONS, "Bus"): inputs["vehicle_positions"],
+        (rt_fetch.TRIP_UPDATES, "Bus"): inputs["trip_updates"],
+    }
+
+
+def _live_snapshot(contents):
+    """realtime.get_live_bus_data minus the network: parse, join and classify."""
+    return len(rt_pipeline.build_live_snapshot(contents, ("Bus",)))
+
+
+STAGES = [
+    Stage("extract_file", "static", lambda inputs: inputs["static_zip"], _extract_files),
+    Stage("classify_region", "static", lambda inputs: _read_tables(inputs)["stops.txt"], _classify_regions),
+    Stage("build_feed_index", "static", _read_tables, _build_index),
+    Stage("get_route_shapes", "static", _route_shapes_setup, _route_shapes),
+    Stage("get_route_stops", "static", _index_setup, _route_stops),
+    Stage("store_to_postgres", "static", _store_setup, _store),
+    Stage("parse_vehicle_positions", "realtime", lambda inputs: inputs["vehicle_positions"], _parse_vehicle_positions),
+    Stage("get_live_bus_data", "realtime", _live_snapshot_setup, _live_snapshot),
+]
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+
+
+def _proc_status_bytes(field):
+    with open("/proc/self/status") as f:
+        return int(re.search(rf"^{field}:\s+(\d+) kB", f.read(), re.MULTILINE)[1]) * 1024
+
+
+def _stage_peak_bytes(stage, arg):
+    """Peak memory one run of `stage` adds on top of what the process already holds.
+
+    ru_maxrss is no use here: a spawned child inherits its parent's peak.
+    """
+    try:
+        # "5" resets the kernel's RSS high-water mark (VmHWM) to the current RSS
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        before = _proc_status_bytes("VmRSS")
+        stage.run(arg)
+        return _proc_status_bytes("VmHWM") - before
+    except OSError:
+        # Not Linux: tracemalloc sees Python and NumPy allocations, not Arrow's
+        tracemalloc.start()
+        try:
+            stage.run(arg)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+
+def _measure(stage_name, inputs, repeat, results):
+    """Child process body: set up, time `repeat` runs, report median, rows and the stage's peak memory."""
+    stage = STAGES_BY_NAME[stage_name]
+    with open(inputs["vehicle_positions_path"], "rb") as f:
+        inputs["vehicle_positions"] = f.read()
+    with open(inputs["trip_updates_path"], "rb") as f:
+        inputs["trip_updates"] = f.read()
+
+    arg = stage.setup(inputs)
+    rows = stage.run(arg)  # warm up imports and caches
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        stage.run(arg)
+        times.append(time.perf_counter() - started)
+    # Measured on an extra, untimed run so tracemalloc can't slow the timed ones
+    results.put({"seconds": statistics.median(times), "rows": rows, "peak_bytes": _stage_peak_bytes(stage, arg)})
+
+
+def prepare_inputs(directory, scale, fixtures=None, static_zip=None):
+    """Write the feeds for one scale to `directory`; returns the paths the stages read."""
+    if fixtures:
+        with open(os.path.join(fixtures, f"{rt_fetch.VEHICLE_POSITIONS}_Bus.pb"), "rb") as f:
+            vehicle_positions = replay_server.scale_feed(f.read(), scale)
+        with open(os.path.join(fixtures, f"{rt_fetch.TRIP_UPDATES}_Bus.pb"), "rb") as f:
+            trip_updates = replay_server.scale_feed(f.read(), scale)
+    else:
+        vehicle_positions = synthetic.vehicle_positions_feed(BASE_VEHICLES * scale)
+        trip_updates = synthetic.trip_updates_feed(BASE_VEHICLES * scale)
+
+    inputs = {
+        "vehicle_positions_path": os.path.join(directory, f"vehicle_positions_{scale}x.pb"),
+        "trip_updates_path": os.path.join(directory, f"trip_updates_{scale}x.pb"),
+    }
+    with open(inputs["vehicle_positions_path"], "wb") as f:
+        f.write(vehicle_positions)
+    with open(inputs["trip_updates_path"], "wb") as f:
+        f.write(trip_updates)
+
+    # A real static feed can't be scaled up, so it only stands in at 1x
+    if static_zip and scale == 1:
+        inputs["static_zip"] = static_zip
+    elif not static_zip:
+        inputs["static_zip"] = synthetic.static_feed_zip(os.path.join(directory, f"gtfs_{scale}x.zip"), scale)
+    return inputs
+
+
+def run_stage(stage_name, inputs, repeat):
+    """Run one stage in a fresh process and return its measurements."""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(stage_name, inputs, repeat, results))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"{stage_name} failed with exit code {process.exitcode}")
+    return results.get()
+
+
+def compare(results, baseline, threshold):
+    """Return the result keys whose median time regressed past `threshold` against `baseline`."""
+    return [
+        key for key, result in results.items()
+        if key in baseline and result["seconds"] > baseline[key]["seconds"] * (1 + threshold)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", help="directory with recorded VehiclePositions_Bus.pb / TripUpdates_Bus.pb")
+    parser.add_argument("--static-zip", help="real GTFS ZIP for the static stages (1x only)")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(SCALES))
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES_BY_NAME), help="run only these stages")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--dsn", help="scratch Postgres database for store_to_postgres")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="exit 1 if a stage regressed against the baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    stages = [STAGES_BY_NAME[name] for name in args.stages] if args.stages else STAGES
+    if not args.dsn:
+        stages = [stage for stage in stages if stage.name != "store_to_postgres"]
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    print(f"{'stage':<26} {'scale':>5} {'rows':>10} {'median ms':>10} {'rows/s':>12} {'peak MiB':>13} {'vs base':>8}")
+    with tempfile.TemporaryDirectory(prefix="gtfs-bench-") as directory:
+        for scale in args.scales:
+            inputs = prepare_inputs(directory, scale, args.fixtures, args.static_zip)
+            inputs["dsn"] = args.dsn
+            for stage in stages:
+                if stage.kind == "static" and "static_zip" not in inputs:
+                    continue
+                key = f"{stage.name}@{scale}x"
+                result = results[key] = run_stage(stage.name, inputs, args.repeat)
+                change = ""
+                if key in baseline:
+                    change = f"{result['seconds'] / baseline[key]['seconds'] - 1:+.0%}"
+                print(
+                    f"{stage.name:<26} {scale:>4}x {result['rows']:>10} {result['seconds'] * 1000:>10.1f} "
+                    f"{result['rows'] / result['seconds']:>12,.0f} {result['peak_bytes'] / 2**20:>13.0f} {change:>8}"
+                )
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({**baseline, **results}, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+
+    if args.compare:
+        regressed = compare(results, baseline, args.threshold)
+        if regressed:
+            print(f"Regressed by more than {args.threshold:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Synthetic SEQ-like GTFS-RT feeds and static GTFS ZIPs for benchmarks when no recording is at hand."""
+import random
+import zipfile
+
+import numpy as np
+import pandas as pd
+from google.transit import gtfs_realtime_pb2
+
+FEED_TIMESTAMP = 1_700_000_000
+
+
+def _feed(timestamp):
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    feed.header.timestamp = timestamp
+    return feed
+
+
+def vehicle_positions_feed(n_vehicles, seed=0, timestamp=FEED_TIMESTAMP):
+    """Serialise a VehiclePositions feed with `n_vehicles` buses spread over SEQ."""
+    rng = random.Random(seed)
+    feed = _feed(timestamp)
+    for i in range(n_vehicles):
+        entity = feed.entity.add()
+        entity.id = f"v{i}"
+        v = entity.vehicle
+        v.trip.trip_id = f"trip-{i}"
+        v.trip.route_id = f"{rng.randint(1, 800)}-4000"
+        v.vehicle.id = v.vehicle.label = f"{i:05d}"
+        v.position.latitude = rng.uniform(-28.2, -26.3)
+        v.position.longitude = rng.uniform(152.8, 153.5)
+        v.current_stop_sequence = rng.randint(1, 60)
+        v.stop_id = str(rng.randint(1, 20000))
+        v.current_status = rng.randint(0, 2)
+        v.timestamp = timestamp - rng.randint(0, 60)
+    return feed.SerializeToString()
+
+
+def trip_updates_feed(n_trips, stops_per_trip=20, seed=0, timestamp=FEED_TIMESTAMP):
+    """Serialise a TripUpdates feed with `stops_per_trip` StopTimeUpdates per trip."""
+    rng = random.Random(seed)
+    feed = _feed(timestamp)
+    for i in range(n_trips):
+        entity = feed.entity.add()
+        entity.id = f"t{i}"
+        tu = entity.trip_update
+        tu.trip.trip_id = f"trip-{i}"
+        tu.trip.route_id = f"{rng.randint(1, 800)}-4000"
+        delay = rng.randint(-120, 600)
+        scheduled = timestamp + rng.randint(0, 3600)
+        for sequence in range(1, stops_per_trip + 1):
+            stu = tu.stop_time_update.add()
+            stu.stop_sequence = sequence
+            stu.stop_id = str(rng.randint(1, 20000))
+            stu.arrival.delay = delay
+            stu.arrival.time = scheduled + delay
+            stu.departure.delay = delay
+            stu.departure.time = scheduled + delay + 20
+            scheduled += 90
+            delay += rng.randint(-30, 30)
+    return feed.SerializeToString()
+
+
+def static_feed_zip(path, scale=1, seed=0):
+    """Write an SEQ-sized GTFS ZIP with `scale` times the routes of the 1x feed.
+
+    At 1x: 200 routes x 2 directions x 8 trips x 30 stops, one 300-point
+    shape per route and direction, and 60 stops per route.
+    """
+    rng = np.random.default_rng(seed)
+    n_routes = 200 * scale
+    stops_per_route, stops_per_trip, trips_per_direction, shape_points = 60, 30, 8, 300
+
+    route_ids = np.array([f"{i}-4000" for i in range(n_routes)])
+    routes = pd.DataFrame({
+        "route_id": route_ids,
+        "route_short_name": [str(i) for i in range(n_routes)],
+        "route_long_name": [f"Route {i}" for i in range(n_routes)],
+        "route_type": 3,
+    })
+
+    # Each route's stops lie along a random line through SEQ
+    start_lat = rng.uniform(-28.2, -26.3, n_routes)
+    start_lon = rng.uniform(152.8, 153.5, n_routes)
+    heading = rng.uniform(0, 2 * np.pi, n_routes)
+    step = np.arange(stops_per_route) / stops_per_route * 0.2
+    stop_lat = (start_lat[:, None] + np.sin(heading)[:, None] * step).ravel()
+    stop_lon = (start_lon[:, None] + np.cos(heading)[:, None] * step).ravel()
+    stop_ids = np.arange(n_routes * stops_per_route).astype(str)
+    stops = pd.DataFrame({
+        "stop_id": stop_ids,
+        "stop_name": [f"Stop {i}" for i in range(len(stop_ids))],
+        "stop_lat": stop_lat,
+        "stop_lon": stop_lon,
+    })
+
+    shape_step = np.arange(shape_points) / shape_points * 0.2
+    shape_ids, shape_lat, shape_lon = [], [], []
+    trip_rows = []
+    stop_time_trip, stop_time_stop, stop_time_sequence = [], [], []
+    for r in range(n_routes):
+        for direction in (0, 1):
+            shape_id = f"{r}-{direction}"
+            sign = 1 if direction == 0 else -1
+            offset = 0 if direction == 0 else 0.2
+            shape_ids.append(np.full(shape_points, shape_id))
+            shape_lat.append(start_lat[r] + np.sin(heading[r]) * (offset + sign * shape_step) + rng.normal(0, 1e-4, shape_points))
+            shape_lon.append(start_lon[r] + np.cos(heading[r]) * (offset + sign * shape_step) + rng.normal(0, 1e-4, shape_points))
+            route_stops = stop_ids[r * stops_per_route:(r + 1) * stops_per_route]
+            route_stops = route_stops if direction == 0 else route_stops[::-1]
+            for t in range(trips_per_direction):
+                trip_id = f"{r}-{direction}-{t}"
+                trip_rows.append((route_ids[r], "weekday", trip_id, direction, shape_id))
+                first = rng.integers(0, stops_per_route - stops_per_trip + 1)
+                stop_time_trip.append(np.full(stops_per_trip, trip_id))
+                stop_time_stop.append(route_stops[first:first + stops_per_trip])
+                stop_time_sequence.append(np.arange(1, stops_per_trip + 1))
+
+    trips = pd.DataFrame(trip_rows, columns=["route_id", "service_id", "trip_id", "direction_id", "shape_id"])
+    n_stop_times = len(stop_time_trip) * stops_per_trip
+    departure = 6 * 3600 + np.arange(n_stop_times) % stops_per_trip * 90
+    stop_times = pd.DataFrame({
+        "trip_id": np.concatenate(stop_time_trip),
+        "arrival_time": [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in departure],
+        "departure_time": [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in departure],
+        "stop_id": np.concatenate(stop_time_stop),
+        "stop_sequence": np.concatenate(stop_time_sequence),
+    })
+    shapes = pd.DataFrame({
+        "shape_id": np.concatenate(shape_ids),
+        "shape_pt_lat": np.concatenate(shape_lat),
+        "shape_pt_lon": np.concatenate(shape_lon),
+        "shape_pt_sequence": np.tile(np.arange(1, shape_points + 1), len(shape_ids)),
+    })
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_obj:
+        for filename, df in [
+            ("routes.txt", routes), ("stops.txt", stops), ("trips.txt", trips),
+            ("stop_times.txt", stop_times), ("shapes.txt", shapes),
+        ]:
+            zip_obj.writestr(filename, df.to_csv(index=False))
+    return path
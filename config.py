@@ -0,0 +1,15 @@
+import os
+
+import streamlit as st
+
+
+def get_setting(name, default=None):
+    """Read a setting from the environment, falling back to Streamlit secrets."""
+    value = os.environ.get(name)
+    if value is not None:
+        return value
+    try:
+        return st.secrets.get(name, default)
+    except Exception:
+        # No secrets.toml (e.g. outside `streamlit run`)
+        return default
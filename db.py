@@ -0,0 +1,140 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL
+
+from config import get_setting
+
+POOL_SIZE = int(get_setting("DB_POOL_SIZE", 5))
+MAX_OVERFLOW = int(get_setting("DB_MAX_OVERFLOW", 5))
+POOL_TIMEOUT = int(get_setting("DB_POOL_TIMEOUT", 30))
+# Recycle connections before Supabase's pooler or a NAT drops them
+POOL_RECYCLE = int(get_setting("DB_POOL_RECYCLE", 1800))
+
+
+def database_url():
+    """Build the Postgres URL from config: DATABASE_URL, or the PG_* settings."""
+    url = get_setting("DATABASE_URL")
+    if url:
+        return url
+
+    # Vw_supabase historically kept its Postgres URL under SUPABASE_URL
+    legacy_url = get_setting("SUPABASE_URL")
+    if legacy_url and legacy_url.startswith("postgres"):
+        return legacy_url
+
+    host = get_setting("PG_HOST")
+    if not host:
+        return None
+    return URL.create(
+        "postgresql+psycopg2",
+        username=get_setting("PG_USER", "postgres"),
+        password=get_setting("PG_PASSWORD"),
+        host=host,
+        port=int(get_setting("PG_PORT", 5432)),
+        database=get_setting("PG_DB", "postgres"),
+    )
+
+
+class Database:
+    """A pooled SQLAlchemy engine shared by every session, with checkout metrics."""
+
+    def __init__(self, url):
+        self.engine = create_engine(
+            url,
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            pool_recycle=POOL_RECYCLE,
+            pool_pre_ping=True,
+            connect_args={"sslmode": get_setting("PG_SSLMODE", "require")},
+        )
+        self._lock = threading.Lock()
+        self._created = {}
+        self.checkouts = 0
+        self.connects = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.age_at_checkout_max = 0.0
+
+        event.listen(self.engine, "connect", self._on_connect)
+        event.listen(self.engine, "checkout", self._on_checkout)
+        event.listen(self.engine, "close", self._on_close)
+        event.listen(self.engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+            self._created[id(dbapi_connection)] = time.monotonic()
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            created = self._created.get(id(dbapi_connection))
+            if created is not None:
+                self.age_at_checkout_max = max(self.age_at_checkout_max, time.monotonic() - created)
+
+    def _on_close(self, dbapi_connection, connection_record):
+        with self._lock:
+            self._created.pop(id(dbapi_connection), None)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self._on_close(dbapi_connection, connection_record)
+
+    def _record_wait(self, started):
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    @contextmanager
+    def connect(self):
+        """Check out a SQLAlchemy connection (for pandas.read_sql)."""
+        started = time.perf_counter()
+        with self.engine.connect() as conn:
+            self._record_wait(started)
+            yield conn
+
+    @contextmanager
+    def raw_connection(self):
+        """Check out a raw psycopg2 connection (for COPY and execute_values)."""
+        started = time.perf_counter()
+        conn = self.engine.raw_connection()
+        self._record_wait(started)
+        try:
+            yield conn
+        finally:
+            # Returns the connection to the pool rather than closing it
+            conn.close()
+
+    def metrics(self):
+        """Return pool sizing, checkout counts, wait times and connection ages."""
+        pool = self.engine.pool
+        now = time.monotonic()
+        with self._lock:
+            ages = [now - created for created in self._created.values()]
+            return {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "open_connections": len(ages),
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "wait_avg_ms": 1000 * self.wait_total / self.checkouts if self.checkouts else 0.0,
+                "wait_max_ms": 1000 * self.wait_max,
+                "connection_age_max_s": max(ages, default=0.0),
+                "connection_age_avg_s": sum(ages) / len(ages) if ages else 0.0,
+                "age_at_checkout_max_s": self.age_at_checkout_max,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_database():
+    """Return the process-wide Database, reused across Streamlit reruns and sessions."""
+    url = database_url()
+    if url is None:
+        raise RuntimeError("Database is not configured: set DATABASE_URL or PG_HOST/PG_PASSWORD.")
+    return Database(url)
@@ -0,0 +1,47 @@
+import pandas as pd
+import streamlit as st
+
+import tracing
+
+
+def render_diagnostics_panel(expanded=False):
+    """Collapsible table of stage latencies, payload sizes and cache hit rates, with exports."""
+    with st.expander("Diagnostics", expanded=expanded):
+        data = tracing.snapshot()
+        if not data["stages"] and not data["caches"]:
+            st.caption("No timings recorded yet.")
+            return
+
+        if data["stages"]:
+            stages_df = pd.DataFrame([
+                {
+                    "stage": name,
+                    "calls": stage["count"],
+                    "mean ms": stage["mean"] * 1000,
+                    "max ms": stage["max"] * 1000,
+                    "total s": stage["sum"],
+                    "payload KiB": stage["payload_bytes"] / 1024,
+                }
+                for name, stage in sorted(data["stages"].items())
+            ])
+            st.dataframe(stages_df.round(1), hide_index=True)
+
+            # Histogram of the slowest stage by total time
+            slowest = max(data["stages"], key=lambda name: data["stages"][name]["sum"])
+            buckets = [f"≤{bound * 1000:g} ms" for bound in data["buckets"]] + ["slower"]
+            st.caption(f"Latency histogram: {slowest}")
+            st.bar_chart(pd.Series(data["stages"][slowest]["counts"], index=buckets))
+
+        if data["caches"]:
+            caches_df = pd.DataFrame([
+                {"cache": name, "hits": cache["hits"], "misses": cache["misses"], "hit rate": f"{cache['hit_rate']:.0%}"}
+                for name, cache in sorted(data["caches"].items())
+            ])
+            st.dataframe(caches_df, hide_index=True)
+
+        col1, col2, col3 = st.columns(3)
+        col1.download_button("JSON", tracing.to_json(), file_name="timings.json", mime="application/json")
+        col2.download_button("Prometheus", tracing.to_prometheus(), file_name="timings.prom", mime="text/plain")
+        if col3.button("Reset"):
+            tracing.reset()
+            st.rerun()
@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+import pyarrow.feather as feather
+
+import gtfs_schema
+
+# On-disk cache of parsed GTFS tables, one sub-directory per feed version
+CACHE_DIR = os.environ.get("GTFS_CACHE_DIR", ".gtfs_cache")
+MAX_CACHED_FEEDS = 2
+MANIFEST_NAME = "manifest.json"
+
+GTFS_TABLES = ["routes.txt", "stops.txt", "trips.txt", "stop_times.txt", "shapes.txt"]
+
+def feed_key(sha256):
+    """Return the cache key for a GTFS ZIP from its SHA-256 hex digest."""
+    return sha256[:16]
+
+
+def read_table(zip_obj, filename, storage=False):
+    """Parse a GTFS file from the ZIP with the column types in gtfs_schema.
+
+    storage=True keeps the source text of non-ID columns for the database
+    loaders; see gtfs_schema.csv_dtypes.
+    """
+    with zip_obj.open(filename) as file:
+        columns = pd.read_csv(file, nrows=0).columns
+
+    dtypes = gtfs_schema.csv_dtypes(filename, columns, storage)
+    with zip_obj.open(filename) as file:
+        df = pd.read_csv(file, dtype=dtypes, low_memory=False)
+    return df if storage else gtfs_schema.apply_schema(filename, df)
+
+
+def _feed_dir(key):
+    return os.path.join(CACHE_DIR, key)
+
+
+def _table_path(directory, filename):
+    return os.path.join(directory, filename.replace(".txt", ".arrow"))
+
+
+def load_tables(key, tables=None):
+    """Memory-map the cached tables for a feed version, or return None on a miss.
+
+    `tables` limits the load to those filenames; a miss if any is not cached.
+    """
+    directory = _feed_dir(key)
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    # Tables parsed with older column types are re-parsed and overwritten
+    if manifest.get("schema_version") != gtfs_schema.SCHEMA_VERSION:
+        return None
+
+    filenames = manifest["tables"] if tables is None else tables
+    if not set(filenames) <= set(manifest["tables"]):
+        return None
+
+    tables = {}
+    for filename in filenames:
+        table = feather.read_table(_table_path(directory, filename), memory_map=True)
+        tables[filename] = table.to_pandas(split_blocks=True)
+
+    # Touch the manifest so pruning keeps the most recently used feeds
+    os.utime(manifest_path)
+    return tables
+
+
+def _cached_feeds():
+    """(last used time, key) for every complete feed version in the cache."""
+    if not os.path.isdir(CACHE_DIR):
+        return []
+
+    feeds = []
+    for name in os.listdir(CACHE_DIR):
+        manifest_path = os.path.join(CACHE_DIR, name, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            feeds.append((os.path.getmtime(manifest_path), name))
+    return feeds
+
+
+def latest_key():
+    """Return the key of the most recently used cached feed version, or None if none is cached."""
+    feeds = _cached_feeds()
+    return max(feeds)[1] if feeds else None
+
+
+def save_tables(key, tables):
+    """Write parsed tables for a feed version as uncompressed Arrow IPC files."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=f".{key}-", dir=CACHE_DIR)
+    try:
+        for filename, df in tables.items():
+            feather.write_feather(
+                df.reset_index(drop=True),
+                _table_path(staging_dir, filename),
+                compression="uncompressed",
+            )
+        manifest = {
+            "feed_key": key,
+            "schema_version": gtfs_schema.SCHEMA_VERSION,
+            "tables": list(tables),
+            "rows": {filename: len(df) for filename, df in tables.items()},
+        }
+        with open(os.path.join(staging_dir, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f)
+
+        # Publish atomically so readers never see a half-written feed
+        directory = _feed_dir(key)
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(staging_dir, directory)
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    prune_cache()
+
+
+def prune_cache(keep=MAX_CACHED_FEEDS):
+    """Remove all but the `keep` most recently used feed versions."""
+    for _, name in sorted(_cached_feeds(), reverse=True)[keep:]:
+        shutil.rmtree(os.path.join(CACHE_DIR, name), ignore_errors=True)
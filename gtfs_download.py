@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import NamedTuple
+
+import requests
+
+from config import get_setting
+
+# Point at a local replay_server.py with GTFS_ZIP_URL=http://localhost:8765/gtfs.zip
+GTFS_ZIP_URL = get_setting("GTFS_ZIP_URL", "https://www.data.qld.gov.au/dataset/general-transit-feed-specification-gtfs-translink/resource/e43b6b9f-fc2b-4630-a7c9-86dd5483552b/download")
+DOWNLOAD_DIR = os.environ.get("GTFS_DOWNLOAD_DIR", os.path.join(".gtfs_cache", "downloads"))
+CHUNK_SIZE = 1 << 20
+# (connect, read) timeouts; the read timeout applies per chunk, not to the whole body
+TIMEOUT = (10, 60)
+MAX_ATTEMPTS = 4
+
+_download_lock = threading.Lock()
+
+
+class DownloadResult(NamedTuple):
+    path: str
+    not_modified: bool
+    sha256: str
+    etag: str | None
+    last_modified: str | None
+
+
+def download_path(url):
+    """Return the local file a URL is downloaded to."""
+    name = hashlib.sha1(url.encode()).hexdigest()[:12]
+    return os.path.join(DOWNLOAD_DIR, f"{name}.zip")
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _resumes_at(content_range, offset):
+    """True if a 206 Content-Range runs from `offset` to the end of the file."""
+    match = re.match(r"bytes (\d+)-(\d+)/(\d+)$", content_range or "")
+    return bool(match) and int(match[1]) == offset and int(match[2]) + 1 == int(match[3])
+
+
+def _loaded_path(dest_path, target):
+    return f"{dest_path}.{target}.loaded.json"
+
+
+def already_loaded(result, target="postgres"):
+    """True if `result`'s file was fully loaded into `target` by a previous mark_loaded.
+
+    A 304 only says the server copy matches the local file; callers should
+    skip their load by this check instead, so a load that failed after the
+    download is retried on the next run.
+    """
+    return _read_json(_loaded_path(result.path, target)).get("sha256") == result.sha256
+
+
+def mark_loaded(result, target="postgres"):
+    """Record that `result`'s file has been loaded into `target`; call only after the load succeeds."""
+    _write_json(_loaded_path(result.path, target), {"sha256": result.sha256})
+
+
+def download_feed(url, dest_path=None, conditional=True):
+    """Stream `url` to disk, skipping the transfer when the server copy is unchanged.
+
+    Sends If-None-Match/If-Modified-Since from the previous download when
+    `conditional` is set, and resumes an interrupted transfer with a Range
+    request guarded by If-Range. Returns a DownloadResult whose
+    `not_modified` flag tells callers the local file is still current;
+    whether it still has to be loaded is up to already_loaded. Raises requests.RequestException if every attempt fails.
+    """
+    dest_path = dest_path or download_path(url)
+    meta_path = dest_path + ".json"
+    part_path = dest_path + ".part"
+    part_meta_path = part_path + ".json"
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+
+    with _download_lock:
+        meta = _read_json(meta_path)
+        headers = {}
+        if conditional and os.path.exists(dest_path) and meta.get("url") == url:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        last_error = None
+        for _ in range(MAX_ATTEMPTS):
+            part_meta = _read_json(part_meta_path)
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            validator = part_meta.get("etag") or part_meta.get("last_modified")
+
+            request_headers = dict(headers)
+            if offset and validator and part_meta.get("url") == url:
+                request_headers["Range"] = f"bytes={offset}-"
+                request_headers["If-Range"] = validator
+            else:
+                offset = 0
+
+            try:
+                with requests.get(url, headers=request_headers, stream=True, timeout=TIMEOUT) as response:
+                    if response.status_code == 304:
+                        return DownloadResult(dest_path, True, meta["sha256"], meta.get("etag"), meta.get("last_modified"))
+
+                    if response.status_code == 416:
+                        # Stale partial file; start over without a Range header
+                        _remove(part_path, part_meta_path)
+                        continue
+
+                    response.raise_for_status()
+
+                    etag = response.headers.get("ETag")
+                    last_modified = response.headers.get("Last-Modified")
+                    resumed = response.status_code == 206
+                    if resumed and not (offset and _resumes_at(response.headers.get("Content-Range"), offset)):
+                        # Not the range we asked for; start over without a Range header
+                        _remove(part_path, part_meta_path)
+                        continue
+                    if not resumed:
+                        offset = 0
+                        _write_json(part_meta_path, {"url": url, "etag": etag, "last_modified": last_modified})
+
+                    expected = response.headers.get("Content-Length")
+                    expected = offset + int(expected) if expected is not None else None
+
+                    with open(part_path, "ab" if resumed else "wb") as f:
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                            f.write(chunk)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                # Keep the partial file so the next attempt can resume from it
+                last_error = e
+                continue
+
+            if expected is not None and os.path.getsize(part_path) != expected:
+                last_error = requests.ConnectionError(
+                    f"Incomplete download: got {os.path.getsize(part_path)} of {expected} bytes"
+                )
+                continue
+
+            part_meta = _read_json(part_meta_path)
+            os.replace(part_path, dest_path)
+            _remove(part_meta_path)
+
+            meta = {
+                "url": url,
+                "etag": part_meta.get("etag"),
+                "last_modified": part_meta.get("last_modified"),
+                "sha256": _sha256_file(dest_path),
+            }
+            _write_json(meta_path, meta)
+            return DownloadResult(dest_path, False, meta["sha256"], meta["etag"], meta["last_modified"])
+
+        raise last_error or requests.RequestException(f"Could not download {url}")
@@ -0,0 +1,88 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+EMPTY = np.array([], dtype=object)
+
+
+class FeedIndex(NamedTuple):
+    """Lookups built once per feed version so UI changes never scan stop_times."""
+
+    # region -> sorted array of route_ids with at least one stop in the region
+    routes_by_region: dict
+    # route_id -> sorted list of int direction_ids
+    directions_by_route: dict
+    # (route_id, direction_id) -> trip_ids / shape_ids in feed order
+    trips_by_route: dict
+    shapes_by_route: dict
+    # The caller's stop_times, not copied
+    stop_times: pd.DataFrame
+    # Row positions of stop_times ordered by (trip, stop_sequence)
+    stop_time_order: np.ndarray
+    # trip_id -> (start, end) range in stop_time_order
+    trip_rows: dict
+
+
+def _group_arrays(df, keys, column):
+    grouped = df.groupby(keys, observed=True, sort=False)[column].unique()
+    return {key: np.asarray(values, dtype=object) for key, values in grouped.items()}
+
+
+def build_feed_index(stops_df, trips_df, stop_times_df):
+    """Build region, route and trip lookups from the static tables."""
+    # Map each stop_time to its stop's region and its trip's route. On
+    # categorical columns, map() only touches the distinct categories.
+    stop_region = stops_df.set_index("stop_id")["region"]
+    trip_route = trips_df.set_index("trip_id")["route_id"]
+    region_routes = pd.DataFrame({
+        "region": stop_times_df["stop_id"].map(stop_region),
+        "route_id": stop_times_df["trip_id"].map(trip_route),
+    }).dropna().drop_duplicates()
+    routes_by_region = {
+        region: np.sort(np.asarray(route_ids, dtype=object))
+        for region, route_ids in region_routes.groupby("region", observed=True)["route_id"].unique().items()
+    }
+
+    directions_by_route = {
+        route_id: sorted(directions.tolist())
+        for route_id, directions in trips_df.groupby("route_id", observed=True)["direction_id"].unique().items()
+    }
+    trips_by_route = _group_arrays(trips_df, ["route_id", "direction_id"], "trip_id")
+    shapes_by_route = _group_arrays(trips_df.dropna(subset=["shape_id"]), ["route_id", "direction_id"], "shape_id")
+
+    # Sort a permutation rather than the table, so stop_times is held once;
+    # each trip's rows are one contiguous slice of it
+    codes, trip_ids = pd.factorize(stop_times_df["trip_id"])
+    order = np.lexsort((stop_times_df["stop_sequence"].to_numpy(), codes)).astype(np.int32)
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=np.int64)
+    ends = np.r_[starts[1:], len(codes)]
+    # Rows without a trip_id (code -1) sort first and belong to no trip
+    known = codes[starts] >= 0
+    trip_rows = dict(zip(np.asarray(trip_ids)[codes[starts[known]]], zip(starts[known].tolist(), ends[known].tolist())))
+
+    return FeedIndex(
+        routes_by_region, directions_by_route, trips_by_route, shapes_by_route, stop_times_df, order, trip_rows
+    )
+
+
+def routes_for_region(index, region):
+    """Return the route_ids serving a region."""
+    return index.routes_by_region.get(region, EMPTY)
+
+
+def route_trips(index, route_id, direction_id):
+    """Return the trip_ids for a route and direction."""
+    return index.trips_by_route.get((route_id, int(direction_id)), EMPTY)
+
+
+def route_shape_ids(index, route_id, direction_id):
+    """Return the shape_ids used by a route and direction."""
+    return index.shapes_by_route.get((route_id, int(direction_id)), EMPTY)
+
+
+def trip_stop_times(index, trip_id):
+    """Return a trip's stop_times rows ordered by stop_sequence."""
+    start, end = index.trip_rows.get(trip_id, (0, 0))
+    return index.stop_times.iloc[index.stop_time_order[start:end]]
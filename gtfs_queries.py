@@ -0,0 +1,58 @@
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+import db
+
+SEQ_VIEW_NAME = "seq_gtfs_static"
+# Routes whose shapes are kept in memory; the least recently used are evicted
+ROUTE_CACHE_SIZE = 64
+
+# Both queries filter on columns indexed by gtfs_pg_loader.TABLE_INDEXES:
+# gtfs_trips(route_id, direction_id) and gtfs_shapes(shape_id, shape_pt_sequence).
+ROUTE_DIRECTIONS_SQL = text(
+    "SELECT DISTINCT direction_id FROM gtfs_trips WHERE route_id = :route_id ORDER BY direction_id"
+)
+ROUTE_SHAPES_SQL = text(
+    f"""
+    SELECT shape_id,
+           shape_pt_lat::float8 AS shape_pt_lat,
+           shape_pt_lon::float8 AS shape_pt_lon,
+           shape_pt_sequence::int AS shape_pt_sequence
+    FROM {SEQ_VIEW_NAME}
+    WHERE route_id = :route_id AND direction_id = :direction_id
+    ORDER BY shape_id, shape_pt_sequence::int
+    """
+)
+
+
+@st.cache_data(max_entries=ROUTE_CACHE_SIZE, show_spinner=False)
+def _query_route_directions(route_id):
+    with db.get_database().connect() as conn:
+        return pd.read_sql(ROUTE_DIRECTIONS_SQL, conn, params={"route_id": route_id})["direction_id"].tolist()
+
+
+@st.cache_data(max_entries=ROUTE_CACHE_SIZE, show_spinner=False)
+def _query_route_shapes(route_id, direction_id):
+    with db.get_database().connect() as conn:
+        return pd.read_sql(
+            ROUTE_SHAPES_SQL, conn, params={"route_id": route_id, "direction_id": str(direction_id)}
+        )
+
+
+def fetch_route_directions(route_id):
+    """Return the direction_ids that trips on a route run in."""
+    try:
+        return _query_route_directions(route_id)
+    except Exception as e:
+        st.error(f"Failed to load directions for route {route_id}: {e}")
+        return []
+
+
+def fetch_route_shapes(route_id, direction_id):
+    """Return the shape points for one route and direction, ordered for drawing."""
+    try:
+        return _query_route_shapes(route_id, direction_id)
+    except Exception as e:
+        st.error(f"Failed to load shapes for route {route_id}: {e}")
+        return pd.DataFrame()
@@ -8,28 +8,22 @@ from datetime import datetime, timedelta
 import time
 import pytz
 
+import regions
+import rt_fetch
+
 def fetch_gtfs_rt(url):
     """Fetch GTFS-RT data from a given URL."""
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        return response.content
+        return rt_fetch.fetch(url)
     except requests.RequestException as e:
         st.error(f"Error fetching GTFS-RT data: {e}")
         return None
 
 # --- CONSTANTS ---
-SEQ_VEHICLE_POSITIONS_URL = "https://gtfsrt.api.translink.com.au/api/realtime/SEQ/VehiclePositions/Bus"
-SEQ_TRIP_UPDATES_URL = "https://gtfsrt.api.translink.com.au/api/realtime/SEQ/TripUpdates/Bus"
+SEQ_VEHICLE_POSITIONS_URL = rt_fetch.feed_url(rt_fetch.VEHICLE_POSITIONS, "Bus")
+SEQ_TRIP_UPDATES_URL = rt_fetch.feed_url(rt_fetch.TRIP_UPDATES, "Bus")
 BRISBANE_TZ = pytz.timezone('Australia/Brisbane')
 
-# Region boundaries defined as a clear structure
-REGION_BOUNDS = {
-    "Brisbane": {"lat": (-27.75, -27.0), "lon": (152.75, 153.5)},
-    "Gold Coast": {"lat": (-28.2, -27.78), "lon": (153.2, 153.6)},
-    "Sunshine Coast": {"lat": (-26.9, -26.3), "lon": (152.8, 153.2)},
-}
-
 
 def _fetch_and_parse_gtfs(url: str) -> gtfs_realtime_pb2.FeedMessage | None:
     """Helper to fetch and parse GTFS-RT data."""
@@ -72,13 +66,6 @@ def get_vehicle_updates() -> pd.DataFrame:
     veh_update = vehicles_df.merge(updates_df, on=["trip_id", "route_id"], how="left")
     veh_update["route_name"] = veh_update["route_id"].str.split("-").str[0]
     
-    # --- Efficient Region Categorization ---
-    conditions = [
-        (veh_update["lat"].between(*bounds["lat"]) & veh_update["lon"].between(*bounds["lon"]))
-        for region, bounds in REGION_BOUNDS.items()
-    ]
-    choices = list(REGION_BOUNDS.keys())
-    
-    veh_update["region"] = np.select(conditions, choices, default="Other")
+    veh_update["region"] = regions.classify_points(veh_update["lat"], veh_update["lon"])
     
     return veh_update
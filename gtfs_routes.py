@@ -0,0 +1,50 @@
+"""Per-route lookups behind the route viewer, importable without the Streamlit UI."""
+import numpy as np
+import pandas as pd
+
+import gtfs_index
+import gtfs_shapes
+
+
+def get_route_shapes(route_id, direction, feed_index, shape_lods, full_detail=False):
+    """Retrieve line segments (point -> next point) for a given route ID and direction.
+
+    Returns the segments and the zoom that fits them; the segments are
+    simplified for that zoom unless full_detail is set.
+    """
+    shape_ids = gtfs_index.route_shape_ids(feed_index, route_id, direction)
+    # The coarsest level is enough to fit the view
+    coarse = gtfs_shapes.segments_for_shapes(shape_lods.levels[0], shape_ids)
+    if coarse.empty:
+        return coarse, 12
+    # Both ends of each segment, so every shape's last vertex is in the bounds
+    zoom = gtfs_shapes.zoom_for_bounds(
+        np.concatenate([coarse["shape_pt_lat"].to_numpy(), coarse["next_lat"].to_numpy()]),
+        np.concatenate([coarse["shape_pt_lon"].to_numpy(), coarse["next_lon"].to_numpy()]),
+    )
+    level = shape_lods.levels[-1] if full_detail else gtfs_shapes.level_for_zoom(shape_lods, zoom)
+    return gtfs_shapes.segments_for_shapes(level, shape_ids), zoom
+
+
+def get_route_stops(route_id, direction, feed_index, stops_df):
+    """Retrieve stops for a given route ID and direction."""
+    # Get a representative trip for this route and direction
+    trip_ids = gtfs_index.route_trips(feed_index, route_id, direction)
+
+    if len(trip_ids) == 0:
+        return pd.DataFrame()
+
+    # Take the first trip as representative
+    rep_trip_id = trip_ids[0]
+
+    # Get stops for this trip, already ordered by stop_sequence
+    trip_stops = gtfs_index.trip_stop_times(feed_index, rep_trip_id)
+
+    # Merge with stops data to get coordinates
+    # Coordinates and sequences are already typed by gtfs_schema at load
+    stops_in_route = trip_stops.merge(stops_df, on="stop_id", how="left")
+
+    # Ensure stop_sequence is a string for the text layer
+    stops_in_route["stop_sequence_text"] = stops_in_route["stop_sequence"].astype(str)
+
+    return stops_in_route
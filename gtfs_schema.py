@@ -0,0 +1,140 @@
+"""Column types for the static GTFS tables, applied once when a file is parsed.
+
+IDs repeated across many rows are categoricals, sequences and enums are
+small ints, coordinates float32, and HH:MM:SS times int32 seconds since
+midnight. Columns not listed here are read as strings.
+"""
+import numpy as np
+import pandas as pd
+
+# Bump when SCHEMAS changes so tables cached with the old types are re-parsed
+SCHEMA_VERSION = 1
+
+# Marks GTFS time columns; hours may run past 24 for trips ending after midnight
+TIME = "time"
+MISSING_TIME = -1
+# Blank value of an integer column without a GTFS default
+MISSING_INT = -1
+
+SCHEMAS = {
+    "routes.txt": {
+        "route_type": "int16",
+    },
+    "stops.txt": {
+        "stop_lat": "float32",
+        "stop_lon": "float32",
+        "zone_id": "category",
+        "parent_station": "category",
+        "location_type": "int8",
+        "wheelchair_boarding": "int8",
+        "platform_code": "category",
+    },
+    "trips.txt": {
+        "route_id": "category",
+        "service_id": "category",
+        "trip_headsign": "category",
+        "direction_id": "int8",
+        "shape_id": "category",
+        "wheelchair_accessible": "int8",
+        "bikes_allowed": "int8",
+    },
+    "stop_times.txt": {
+        "trip_id": "category",
+        "arrival_time": TIME,
+        "departure_time": TIME,
+        "stop_id": "category",
+        "stop_sequence": "int32",
+        "stop_headsign": "category",
+        "pickup_type": "int8",
+        "drop_off_type": "int8",
+        "timepoint": "int8",
+        "shape_dist_traveled": "float32",
+    },
+    "shapes.txt": {
+        "shape_id": "category",
+        "shape_pt_lat": "float32",
+        "shape_pt_lon": "float32",
+        "shape_pt_sequence": "int32",
+        "shape_dist_traveled": "float32",
+    },
+}
+
+# What a blank means in optional GTFS enum columns
+INT_DEFAULTS = {
+    "location_type": 0,
+    "wheelchair_boarding": 0,
+    "wheelchair_accessible": 0,
+    "bikes_allowed": 0,
+    "pickup_type": 0,
+    "drop_off_type": 0,
+    "timepoint": 1,
+}
+
+_NULLABLE_INTS = {"int8": "Int8", "int16": "Int16", "int32": "Int32"}
+
+
+def csv_dtypes(filename, columns, storage=False):
+    """read_csv dtypes for the given columns of a GTFS file.
+
+    With storage=True only IDs and coordinates are typed (the coordinates
+    as float64) and every other column keeps its source text, so rows
+    written to the database match the feed exactly.
+    """
+    schema = SCHEMAS.get(filename, {})
+    dtypes = {}
+    for column in columns:
+        dtype = schema.get(column, str)
+        if storage:
+            dtype = {"category": "category", "float32": "float64"}.get(dtype, str)
+        elif dtype == TIME:
+            # Few distinct times repeat across stop_times; parse each once
+            dtype = "category"
+        elif dtype in _NULLABLE_INTS:
+            dtype = _NULLABLE_INTS[dtype]
+        dtypes[column] = dtype
+    return dtypes
+
+
+def apply_schema(filename, df):
+    """Finish typing a frame read with csv_dtypes: parse times and fill blank ints."""
+    for column, dtype in SCHEMAS.get(filename, {}).items():
+        if column not in df:
+            continue
+        if dtype == TIME:
+            df[column] = parse_times(df[column])
+        elif dtype in _NULLABLE_INTS:
+            df[column] = df[column].fillna(INT_DEFAULTS.get(column, MISSING_INT)).to_numpy(dtype)
+    return df
+
+
+def _seconds(text):
+    hours, minutes, seconds = text.strip().split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def parse_times(values):
+    """GTFS HH:MM:SS times as int32 seconds since midnight; blanks become MISSING_TIME."""
+    values = pd.Categorical(values)
+    seconds = np.fromiter(map(_seconds, values.categories), dtype=np.int32, count=len(values.categories))
+    # Code -1 (blank) picks the appended MISSING_TIME
+    return np.append(seconds, np.int32(MISSING_TIME))[values.codes]
+
+
+def memory_report(tables):
+    """Rows and in-memory size of each table, largest first.
+
+    `tables` maps GTFS filenames to DataFrames; sizes include the
+    strings held by object and categorical columns.
+    """
+    rows = []
+    for filename, df in tables.items():
+        usage = df.memory_usage(deep=True, index=False)
+        rows.append({
+            "table": filename,
+            "rows": len(df),
+            "MiB": usage.sum() / 2**20,
+            "bytes/row": usage.sum() / len(df) if len(df) else 0.0,
+            "largest column": usage.idxmax() if len(usage) else "",
+            "text columns": df.select_dtypes(include=["object", "string"]).shape[1],
+        })
+    return pd.DataFrame(rows).sort_values("MiB", ascending=False, ignore_index=True)
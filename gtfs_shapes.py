@@ -0,0 +1,131 @@
+import bisect
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import shapely
+
+
+class ShapeSegments(NamedTuple):
+    """Line segments for every shape, stored contiguously per shape_id."""
+
+    # One row per shape point that has a successor, with next_lat/next_lon
+    segments: pd.DataFrame
+    # shape_id -> (start, end) row range in segments
+    rows: dict
+
+
+def build_shape_segments(shapes_df):
+    """Pair every shape point with the next point of the same shape in one pass."""
+    shapes = shapes_df.sort_values(["shape_id", "shape_pt_sequence"]).reset_index(drop=True)
+    codes, shape_ids = pd.factorize(shapes["shape_id"])
+
+    # A point starts a segment when the following row belongs to the same shape
+    has_next = np.zeros(len(codes), dtype=bool)
+    has_next[:-1] = codes[1:] == codes[:-1]
+    lat = shapes["shape_pt_lat"].to_numpy()
+    lon = shapes["shape_pt_lon"].to_numpy()
+
+    segments = shapes[has_next].reset_index(drop=True)
+    segments["next_lat"] = lat[1:][has_next[:-1]]
+    segments["next_lon"] = lon[1:][has_next[:-1]]
+
+    segment_codes = codes[has_next]
+    starts = np.flatnonzero(np.r_[True, segment_codes[1:] != segment_codes[:-1]]) if len(segment_codes) else np.array([], dtype=np.int64)
+    ends = np.r_[starts[1:], len(segment_codes)]
+    rows = dict(zip(np.asarray(shape_ids)[segment_codes[starts]], zip(starts.tolist(), ends.tolist())))
+
+    return ShapeSegments(segments, rows)
+
+
+def segments_for_shapes(shape_segments, shape_ids):
+    """Return the segments of the given shapes, in the order the ids are given."""
+    ranges = [shape_segments.rows[shape_id] for shape_id in shape_ids if shape_id in shape_segments.rows]
+    if not ranges:
+        return pd.DataFrame()
+
+    positions = np.concatenate([np.arange(start, end) for start, end in ranges])
+    return shape_segments.segments.iloc[positions].reset_index(drop=True)
+
+
+# Zoom levels a simplified copy of every shape is kept for, coarsest first
+LOD_ZOOMS = (8, 10, 12, 14)
+MAX_ZOOM = 18
+TILE_SIZE = 256
+
+
+class ShapeLODs(NamedTuple):
+    """Shape segments at several levels of detail."""
+
+    # Ascending; levels[i] is simplified for zooms[i]
+    zooms: tuple
+    # len(zooms) + 1 entries; the last holds the unsimplified shapes
+    levels: list
+
+
+def tolerance_for_zoom(zoom):
+    """Simplification tolerance in degrees: half a screen pixel at `zoom`."""
+    return 0.5 * 360 / (TILE_SIZE * 2 ** zoom)
+
+
+def zoom_for_bounds(lat, lon, width=700, height=500, padding=0.1):
+    """The integer web-mercator zoom at which the points fit a width x height pixel view."""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.asarray(lon, dtype=np.float64)
+    if not len(lat):
+        return MAX_ZOOM
+
+    y = np.log(np.tan(np.pi / 4 + lat / 2))
+    span_x = (lon.max() - lon.min()) / 360
+    span_y = (y.max() - y.min()) / (2 * np.pi)
+    with np.errstate(divide="ignore"):
+        zoom_x = np.log2(width / (TILE_SIZE * span_x)) if span_x > 0 else MAX_ZOOM
+        zoom_y = np.log2(height / (TILE_SIZE * span_y)) if span_y > 0 else MAX_ZOOM
+    zoom = min(zoom_x, zoom_y) - np.log2(1 + padding)
+    return int(np.clip(np.floor(zoom), 0, MAX_ZOOM))
+
+
+def simplify_shapes(shapes_df, tolerance):
+    """Douglas-Peucker simplify every shape at `tolerance` degrees.
+
+    Returns shape_id, shape_pt_lat, shape_pt_lon and a renumbered
+    shape_pt_sequence, ordered by shape. Shapes are simplified together
+    in vectorised shapely calls rather than one LineString at a time.
+    """
+    shapes = shapes_df.sort_values(["shape_id", "shape_pt_sequence"])
+    codes, shape_ids = pd.factorize(shapes["shape_id"])
+    # A line needs two points; single-point shapes draw nothing either way
+    keep = np.bincount(codes, minlength=len(shape_ids))[codes] >= 2
+    codes = codes[keep]
+    coords = np.column_stack([
+        shapes["shape_pt_lon"].to_numpy(np.float64)[keep],
+        shapes["shape_pt_lat"].to_numpy(np.float64)[keep],
+    ])
+    if not len(coords):
+        return pd.DataFrame(columns=["shape_id", "shape_pt_lat", "shape_pt_lon", "shape_pt_sequence"])
+
+    present, codes = np.unique(codes, return_inverse=True)
+    lines = shapely.linestrings(coords, indices=codes)
+    simplified = shapely.simplify(lines, tolerance, preserve_topology=False)
+    points, index = shapely.get_coordinates(simplified, return_index=True)
+
+    starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+    sequence = np.arange(len(index)) - np.repeat(starts, np.diff(np.r_[starts, len(index)]))
+    return pd.DataFrame({
+        "shape_id": np.asarray(shape_ids)[present[index]],
+        "shape_pt_lat": points[:, 1],
+        "shape_pt_lon": points[:, 0],
+        "shape_pt_sequence": sequence.astype(np.int32),
+    })
+
+
+def build_shape_lods(shapes_df, zooms=LOD_ZOOMS):
+    """Precompute shape segments simplified for each of `zooms`, plus the full-detail level."""
+    levels = [build_shape_segments(simplify_shapes(shapes_df, tolerance_for_zoom(zoom))) for zoom in zooms]
+    levels.append(build_shape_segments(shapes_df))
+    return ShapeLODs(tuple(zooms), levels)
+
+
+def level_for_zoom(shape_lods, zoom):
+    """The coarsest level that is still accurate to half a pixel at `zoom`."""
+    return shape_lods.levels[bisect.bisect_left(shape_lods.zooms, zoom)]
@@ -1,136 +1,141 @@
 import pandas as pd
 import requests
 import zipfile
-import io
 import streamlit as st
 import pydeck as pdk
 
-# GTFS Static Data URL
-GTFS_ZIP_URL = "https://www.data.qld.gov.au/dataset/general-transit-feed-specification-gtfs-translink/resource/e43b6b9f-fc2b-4630-a7c9-86dd5483552b/download"
+import gtfs_cache
+import gtfs_download
+import gtfs_index
+import gtfs_routes
+import gtfs_schema
+import gtfs_shapes
+import regions
+import spatial_index
 
-def download_gtfs():
-    """Download GTFS ZIP file and return as an in-memory object."""
-    try:
-        response = requests.get(GTFS_ZIP_URL, timeout=10)
-        response.raise_for_status()
-        return zipfile.ZipFile(io.BytesIO(response.content))
-    except requests.RequestException as e:
-        st.error(f"Error downloading GTFS data: {e}")
-        return None
+# GTFS Static Data URL
+GTFS_ZIP_URL = gtfs_download.GTFS_ZIP_URL
+# direction_id values; trips with a blank direction_id are read as gtfs_schema.MISSING_INT
+DIRECTION_LABELS = {0: "Outbound", 1: "Inbound"}
 
 def extract_file(zip_obj, filename):
-    """Extract a file from GTFS ZIP archive and return as a DataFrame."""
+    """Extract a file from GTFS ZIP archive and return as a typed DataFrame."""
     try:
-        with zip_obj.open(filename) as file:
-            return pd.read_csv(file, dtype=str, low_memory=False)
+        return gtfs_cache.read_table(zip_obj, filename)
     except Exception as e:
         st.warning(f"Could not read {filename}: {e}")
         return pd.DataFrame()
 
-def classify_region(lat, lon):
-    """Classify a stop into Brisbane, Gold Coast, Sunshine Coast, or Other based on lat/lon."""
-    lat, lon = float(lat), float(lon)
-    if -28.2 <= lat <= -27.8 and 153.2 <= lon <= 153.5:
-        return "Gold Coast"
-    elif -27.7 <= lat <= -27.2 and 152.8 <= lon <= 153.5:
-        return "Brisbane"
-    elif -27.2 <= lat <= -26.3 and 152.8 <= lon <= 153.3:
-        return "Sunshine Coast"
-    else:
-        return "Other"
+@st.cache_resource(ttl=3600, show_spinner="Loading GTFS data...")
+def load_current_feed():
+    """Download the GTFS ZIP (conditionally) and return its tables and feed key.
+
+    Parsed tables are cached on disk per feed version, so an unchanged feed
+    is memory-mapped from the cache instead of being re-parsed. A failed
+    download raises requests.RequestException, so it is never cached.
+    """
+    download = gtfs_download.download_feed(GTFS_ZIP_URL)
+    key = gtfs_cache.feed_key(download.sha256)
+    tables = gtfs_cache.load_tables(key)
+    if tables is None:
+        with zipfile.ZipFile(download.path) as zip_obj:
+            tables = {filename: extract_file(zip_obj, filename) for filename in gtfs_cache.GTFS_TABLES}
+
+        # Classify regions once per feed version; the result is cached with the stops
+        stops_df = tables["stops.txt"]
+        stops_df["region"] = regions.classify_points(stops_df["stop_lat"], stops_df["stop_lon"])
+
+        if all(not df.empty for df in tables.values()):
+            try:
+                gtfs_cache.save_tables(key, tables)
+            except OSError as e:
+                st.warning(f"Could not write GTFS cache: {e}")
+    return tables, key
+
+@st.cache_resource(max_entries=2, show_spinner="Loading cached GTFS data...")
+def load_cached_feed(feed_key):
+    """Memory-map a feed version from the disk cache, or return None if it is not cached."""
+    return gtfs_cache.load_tables(feed_key)
 
 def load_gtfs_data():
-    """Load GTFS data and return routes, stops, trips, stop_times, and shapes."""
-    zip_obj = download_gtfs()
-    if not zip_obj:
-        return None, None, None, None, None
+    """Load GTFS data and return routes, stops, trips, stop_times, shapes, and the feed key.
 
-    routes_df = extract_file(zip_obj, "routes.txt")
-    stops_df = extract_file(zip_obj, "stops.txt")
-    trips_df = extract_file(zip_obj, "trips.txt")
-    stop_times_df = extract_file(zip_obj, "stop_times.txt")
-    shapes_df = extract_file(zip_obj, "shapes.txt")
+    If the download fails, falls back to the most recently used feed in the
+    disk cache; all six values are None if there is none.
+    """
+    try:
+        tables, key = load_current_feed()
+    except requests.RequestException as e:
+        key = gtfs_cache.latest_key()
+        tables = load_cached_feed(key) if key else None
+        if tables is None:
+            st.error(f"Error downloading GTFS data: {e}")
+            return None, None, None, None, None, None
+        st.warning(f"Error downloading GTFS data, showing the last cached feed: {e}")
+
+    return (
+        tables["routes.txt"],
+        tables["stops.txt"],
+        tables["trips.txt"],
+        tables["stop_times.txt"],
+        tables["shapes.txt"],
+        key,
+    )
 
-    # Convert lat/lon to float and classify regions
-    stops_df["stop_lat"] = stops_df["stop_lat"].astype(float)
-    stops_df["stop_lon"] = stops_df["stop_lon"].astype(float)
-    stops_df["region"] = stops_df.apply(lambda row: classify_region(row["stop_lat"], row["stop_lon"]), axis=1)
+@st.cache_resource(max_entries=2, show_spinner="Indexing GTFS data...")
+def load_feed_index(feed_key, _stops_df, _trips_df, _stop_times_df):
+    """Build the route/trip index once per feed version (tables are keyed by feed_key)."""
+    return gtfs_index.build_feed_index(_stops_df, _trips_df, _stop_times_df)
 
-    return routes_df, stops_df, trips_df, stop_times_df, shapes_df
+@st.cache_resource(max_entries=2, show_spinner="Building route shapes...")
+def load_shape_lods(feed_key, _shapes_df):
+    """Build line segments for every shape at each level of detail once per feed version."""
+    return gtfs_shapes.build_shape_lods(_shapes_df)
 
-def get_routes_for_region(region, stops_df, trips_df, routes_df):
-    """Get routes that have stops in the selected region."""
-    stop_ids_in_region = stops_df[stops_df["region"] == region]["stop_id"].unique()
-    trip_ids_in_region = stop_times_df[stop_times_df["stop_id"].isin(stop_ids_in_region)]["trip_id"].unique()
-    route_ids_in_region = trips_df[trips_df["trip_id"].isin(trip_ids_in_region)]["route_id"].unique()
-    
-    return routes_df[routes_df["route_id"].isin(route_ids_in_region)]
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_memory_report(feed_key, _tables):
+    """Per-table memory use of the typed GTFS tables, once per feed version."""
+    return gtfs_schema.memory_report(_tables)
 
-def get_route_shapes(route_id, direction, trips_df, shapes_df):
-    """Retrieve and structure shape points for a given route ID and direction."""
-    trip_shapes = trips_df[(trips_df["route_id"] == route_id) & (trips_df["direction_id"] == str(direction))][["shape_id"]].drop_duplicates()
-    shape_ids = trip_shapes["shape_id"].unique()
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_stop_index(feed_key, _stops_df):
+    """Build the spatial index over stops once per feed version."""
+    return spatial_index.build_grid_index(_stops_df["stop_lat"], _stops_df["stop_lon"])
 
-    if len(shape_ids) == 0:
+def get_stops_in_view(route_shapes, stop_index, stops_df):
+    """Stops inside the bounding box of the route's shapes, for context on the map."""
+    if route_shapes.empty:
         return pd.DataFrame()
+    positions = spatial_index.query_bbox(
+        stop_index,
+        route_shapes["shape_pt_lat"].min(),
+        route_shapes["shape_pt_lon"].min(),
+        route_shapes["shape_pt_lat"].max(),
+        route_shapes["shape_pt_lon"].max(),
+    )
+    return stops_df.iloc[positions]
 
-    route_shapes = shapes_df[shapes_df["shape_id"].isin(shape_ids)]
-    route_shapes = route_shapes.astype({"shape_pt_lat": "float", "shape_pt_lon": "float", "shape_pt_sequence": "int"})
-
-    # Sort by shape_id and sequence
-    route_shapes = route_shapes.sort_values(by=["shape_id", "shape_pt_sequence"])
-
-    # Process each shape_id separately to create line segments
-    line_segments = []
-    
-    for shape_id in shape_ids:
-        shape_points = route_shapes[route_shapes["shape_id"] == shape_id].copy()
-        
-        # Create start-end coordinate pairs for LineLayer
-        shape_points["next_lat"] = shape_points["shape_pt_lat"].shift(-1)
-        shape_points["next_lon"] = shape_points["shape_pt_lon"].shift(-1)
-        
-        # Remove last row (no next point to connect)
-        shape_points = shape_points.dropna(subset=["next_lat", "next_lon"])
-        
-        line_segments.append(shape_points)
-    
-    if not line_segments:
-        return pd.DataFrame()
-        
-    # Combine all line segments
-    return pd.concat(line_segments, ignore_index=True)
-
-def get_route_stops(route_id, direction, trips_df, stop_times_df, stops_df):
-    """Retrieve stops for a given route ID and direction."""
-    # Get a representative trip for this route and direction
-    trip_ids = trips_df[(trips_df["route_id"] == route_id) & (trips_df["direction_id"] == str(direction))]["trip_id"].unique()
-    
-    if len(trip_ids) == 0:
-        return pd.DataFrame()
-    
-    # Take the first trip as representative
-    rep_trip_id = trip_ids[0]
-    
-    # Get stops for this trip with their sequence
-    trip_stops = stop_times_df[stop_times_df["trip_id"] == rep_trip_id].copy()
-    trip_stops = trip_stops.sort_values(by="stop_sequence")
-    
-    # Merge with stops data to get coordinates
-    stops_in_route = trip_stops.merge(stops_df, on="stop_id", how="left")
-    stops_in_route = stops_in_route.astype({"stop_lat": "float", "stop_lon": "float", "stop_sequence": "int"})
-    
-    # Ensure stop_sequence is a string for the text layer
-    stops_in_route["stop_sequence_text"] = stops_in_route["stop_sequence"].astype(str)
-    
-    return stops_in_route
+def get_routes_for_region(region, feed_index, routes_df):
+    """Get routes that have stops in the selected region."""
+    route_ids_in_region = gtfs_index.routes_for_region(feed_index, region)
+    return routes_df[routes_df["route_id"].isin(route_ids_in_region)]
 
-def plot_route_on_map(route_shapes, route_stops, route_color):
+def plot_route_on_map(route_shapes, route_stops, route_color, zoom=12, nearby_stops=None):
     """Plot route path and stops on a map using Pydeck."""
     if route_shapes.empty:
         st.warning("No shape data available for the selected route.")
         return
 
+    # Other stops in view, drawn small and grey underneath the route
+    nearby_layer = pdk.Layer(
+        "ScatterplotLayer",
+        data=nearby_stops if nearby_stops is not None else pd.DataFrame(),
+        get_position=["stop_lon", "stop_lat"],
+        get_color=[150, 150, 150, 160],
+        get_radius=30,
+        pickable=True
+    )
+
     # Line Layer for Route Path
     line_layer = pdk.Layer(
         "LineLayer",
@@ -170,12 +175,12 @@ def plot_route_on_map(route_shapes, route_stops, route_color):
     view_state = pdk.ViewState(
         latitude=route_shapes["shape_pt_lat"].mean(),
         longitude=route_shapes["shape_pt_lon"].mean(),
-        zoom=12,
+        zoom=zoom,
         pitch=0
     )
 
     st.pydeck_chart(pdk.Deck(
-        layers=[line_layer, stop_layer, text_layer],
+        layers=[nearby_layer, line_layer, stop_layer, text_layer],
         initial_view_state=view_state,
         tooltip={"text": "{stop_name} (Stop #{stop_sequence})"}
     ))
@@ -190,31 +195,47 @@ def generate_unique_color(route_id):
 st.title("Public Transport Route Visualisation")
 
 # Load GTFS data
-routes_df, stops_df, trips_df, stop_times_df, shapes_df = load_gtfs_data()
+routes_df, stops_df, trips_df, stop_times_df, shapes_df, feed_key = load_gtfs_data()
 
 if routes_df is not None and not routes_df.empty:
+    feed_index = load_feed_index(feed_key, stops_df, trips_df, stop_times_df)
+    shape_lods = load_shape_lods(feed_key, shapes_df)
+    stop_index = load_stop_index(feed_key, stops_df)
+
+    with st.expander("GTFS memory usage"):
+        st.dataframe(load_memory_report(feed_key, {
+            "routes.txt": routes_df,
+            "stops.txt": stops_df,
+            "trips.txt": trips_df,
+            "stop_times.txt": stop_times_df,
+            "shapes.txt": shapes_df,
+        }).round(1), hide_index=True)
+
     # Region selection with default "Gold Coast"
-    region_selection = st.selectbox("Select a Region", ["Gold Coast", "Brisbane", "Sunshine Coast", "Other"], index=0)
+    region_selection = st.selectbox("Select a Region", regions.region_names(), index=0)
 
     # Filter routes by selected region
-    region_routes_df = get_routes_for_region(region_selection, stops_df, trips_df, routes_df)
+    region_routes_df = get_routes_for_region(region_selection, feed_index, routes_df)
 
     if not region_routes_df.empty:
         # Display routes using route short name
         region_routes_df["route_display"] = "Route " + region_routes_df["route_short_name"] + " (" + region_routes_df["route_id"] + ")"
         route_selection = st.selectbox("Select a Route", region_routes_df["route_id"], format_func=lambda x: region_routes_df.loc[region_routes_df["route_id"] == x, "route_display"].values[0])
 
-        if route_selection and trips_df is not None:
+        if route_selection:
             # Get available directions for the selected route
-            directions = trips_df[trips_df["route_id"] == route_selection]["direction_id"].unique()
-            direction_selection = st.radio("Select Direction", options=directions, format_func=lambda d: "Outbound" if d == "0" else "Inbound")
+            directions = feed_index.directions_by_route.get(route_selection, [])
+            direction_selection = st.radio("Select Direction", options=directions, format_func=lambda d: DIRECTION_LABELS.get(d, "Unspecified direction"))
 
             if direction_selection is not None:
-                route_shapes = get_route_shapes(route_selection, direction_selection, trips_df, shapes_df)
-                route_stops = get_route_stops(route_selection, direction_selection, trips_df, stop_times_df, stops_df)
+                full_detail = st.checkbox("Full shape detail", value=False)
+                route_shapes, zoom = gtfs_routes.get_route_shapes(route_selection, direction_selection, feed_index, shape_lods, full_detail)
+                route_stops = gtfs_routes.get_route_stops(route_selection, direction_selection, feed_index, stops_df)
                 route_color = generate_unique_color(route_selection)
 
-                plot_route_on_map(route_shapes, route_stops, route_color)
+                nearby_stops = get_stops_in_view(route_shapes, stop_index, stops_df) if st.checkbox("Show other stops in view") else None
+
+                plot_route_on_map(route_shapes, route_stops, route_color, zoom, nearby_stops)
     else:
         st.warning("No routes available for the selected region.")
 else:
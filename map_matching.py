@@ -0,0 +1,171 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import spatial_index
+
+# Fixes further than this from their trip's shape are left unsnapped
+MAX_SNAP_DISTANCE_M = 100
+# Upper bound on (vehicle, segment) pairs evaluated at once, to cap memory
+MAX_PAIRS = 2_000_000
+
+
+class ShapeGeometry(NamedTuple):
+    """Every shape's points in projected metres with cumulative distance, stored contiguously."""
+
+    shape_ids: np.ndarray
+    # Points of shape i are offsets[i]:offsets[i + 1]
+    offsets: np.ndarray
+    cos_lat0: float
+    x: np.ndarray
+    y: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+    # Metres along the shape at each point
+    cum_dist: np.ndarray
+    # trip_id -> shape position, for trips that have a shape
+    trip_shapes: pd.Series
+
+
+class Matches(NamedTuple):
+    """Per-vehicle map-matching result; unmatched vehicles keep their raw position."""
+
+    matched: np.ndarray
+    snapped_lat: np.ndarray
+    snapped_lon: np.ndarray
+    # Metres along the trip's shape (NaN when unmatched)
+    dist_along: np.ndarray
+    # Metres between the raw fix and the snapped point (NaN when the trip has no shape)
+    offset: np.ndarray
+
+
+def build_shape_geometry(shapes_df, trips_df) -> ShapeGeometry:
+    """Project every shape once and precompute its cumulative distance array."""
+    shapes = shapes_df.sort_values(["shape_id", "shape_pt_sequence"])
+    codes, shape_ids = pd.factorize(shapes["shape_id"])
+    lat = shapes["shape_pt_lat"].to_numpy(np.float64)
+    lon = shapes["shape_pt_lon"].to_numpy(np.float64)
+    cos_lat0 = float(np.cos(np.radians(lat.mean()))) if len(lat) else 1.0
+    x, y = spatial_index.project(lat, lon, cos_lat0)
+
+    offsets = np.searchsorted(codes, np.arange(len(shape_ids) + 1))
+    step = np.hypot(np.diff(x), np.diff(y))
+    # Steps that cross into the next shape don't count towards distance
+    step[codes[1:] != codes[:-1]] = 0
+    cum_dist = np.r_[0.0, np.cumsum(step)]
+    cum_dist -= np.repeat(cum_dist[offsets[:-1]], np.diff(offsets))
+
+    trips = trips_df[["trip_id", "shape_id"]].dropna()
+    positions = pd.Index(np.asarray(shape_ids, dtype=object)).get_indexer(trips["shape_id"].astype(object))
+    trip_shapes = pd.Series(positions, index=trips["trip_id"].astype(object).to_numpy())
+    trip_shapes = trip_shapes[(positions >= 0) & ~trip_shapes.index.duplicated()]
+
+    return ShapeGeometry(np.asarray(shape_ids, dtype=object), offsets, cos_lat0, x, y, lat, lon, cum_dist, trip_shapes)
+
+
+def shape_codes(geometry, trip_ids):
+    """Shape position for each trip_id; -1 where the trip is unknown or has no shape."""
+    codes = geometry.trip_shapes.reindex(np.asarray(trip_ids, dtype=object)).to_numpy()
+    return np.where(np.isnan(codes), -1, codes).astype(np.int64)
+
+
+def _project_chunk(geometry, codes, px, py):
+    """Nearest point on each vehicle's shape; every shape here has at least one segment."""
+    first = geometry.offsets[codes]
+    counts = geometry.offsets[codes + 1] - first - 1
+    group_starts = np.r_[0, np.cumsum(counts)[:-1]]
+    owner = np.repeat(np.arange(len(codes)), counts)
+    segment = first[owner] + np.arange(counts.sum()) - group_starts[owner]
+
+    ax, ay = geometry.x[segment], geometry.y[segment]
+    dx, dy = geometry.x[segment + 1] - ax, geometry.y[segment + 1] - ay
+    length2 = dx * dx + dy * dy
+    t = ((px[owner] - ax) * dx + (py[owner] - ay) * dy) / np.where(length2 > 0, length2, 1)
+    t = np.clip(t, 0, 1)
+    qx, qy = ax + t * dx, ay + t * dy
+    d2 = (px[owner] - qx) ** 2 + (py[owner] - qy) ** 2
+
+    # First segment per vehicle attaining that vehicle's minimum distance
+    best_d2 = np.minimum.reduceat(d2, group_starts)
+    candidates = np.flatnonzero(d2 == best_d2[owner])
+    _, first_best = np.unique(owner[candidates], return_index=True)
+    best = candidates[first_best]
+
+    seg = segment[best]
+    dist_along = geometry.cum_dist[seg] + t[best] * np.sqrt(length2[best])
+    lat = geometry.lat[seg] + t[best] * (geometry.lat[seg + 1] - geometry.lat[seg])
+    lon = geometry.lon[seg] + t[best] * (geometry.lon[seg + 1] - geometry.lon[seg])
+    return lat, lon, dist_along, np.sqrt(best_d2)
+
+
+def match_vehicles(geometry, trip_ids, lat, lon, max_distance=MAX_SNAP_DISTANCE_M) -> Matches:
+    """Project each vehicle onto its trip's shape (trips.shape_id).
+
+    All vehicles are matched in vectorised chunks against every segment of
+    their own shape; only fixes within `max_distance` metres are snapped.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    n = len(lat)
+    snapped_lat, snapped_lon = lat.copy(), lon.copy()
+    dist_along = np.full(n, np.nan)
+    offset = np.full(n, np.nan)
+
+    codes = shape_codes(geometry, trip_ids)
+    has_shape = codes >= 0
+    has_shape[has_shape] = np.diff(geometry.offsets)[codes[has_shape]] >= 2
+    rows = np.flatnonzero(has_shape)
+    px, py = spatial_index.project(lat, lon, geometry.cos_lat0)
+
+    # Chunk by cumulative segment count so the pairwise arrays stay bounded
+    pairs = np.cumsum(np.diff(geometry.offsets)[codes[rows]] - 1)
+    for chunk in np.split(rows, np.searchsorted(pairs, np.arange(MAX_PAIRS, pairs[-1] if len(pairs) else 0, MAX_PAIRS))):
+        if not len(chunk):
+            continue
+        chunk_lat, chunk_lon, chunk_dist, chunk_offset = _project_chunk(geometry, codes[chunk], px[chunk], py[chunk])
+        dist_along[chunk] = chunk_dist
+        offset[chunk] = chunk_offset
+        snapped_lat[chunk] = chunk_lat
+        snapped_lon[chunk] = chunk_lon
+
+    matched = offset <= max_distance
+    snapped_lat = np.where(matched, snapped_lat, lat)
+    snapped_lon = np.where(matched, snapped_lon, lon)
+    dist_along[~matched] = np.nan
+    return Matches(matched, snapped_lat, snapped_lon, dist_along, offset)
+
+
+def path_along(geometry, code, start, end):
+    """[[lat, lon], ...] following shape `code` from `start` to `end` metres along it."""
+    first, last = geometry.offsets[code], geometry.offsets[code + 1]
+    cum = geometry.cum_dist[first:last]
+    lat, lon = geometry.lat[first:last], geometry.lon[first:last]
+    inner = np.flatnonzero((cum > start) & (cum < end))
+    points = [[float(np.interp(start, cum, lat)), float(np.interp(start, cum, lon))]]
+    points += np.column_stack([lat[inner], lon[inner]]).tolist()
+    points.append([float(np.interp(end, cum, lat)), float(np.interp(end, cum, lon))])
+    return points
+
+
+def trails_along_shapes(geometry, trails, trip_ids):
+    """Replace straight trails with the shape path between their first and last fixes.
+
+    `trails` is rt_tracker's {vehicle_id: [[lat, lon], ...]} and `trip_ids`
+    maps vehicle_id to its current trip. Trails whose ends don't both
+    match forwards along the same shape are kept as they are.
+    """
+    vehicle_ids = list(trails)
+    if not vehicle_ids:
+        return trails
+    trip = [trip_ids.get(vehicle_id) for vehicle_id in vehicle_ids]
+    starts = np.array([trails[vehicle_id][0] for vehicle_id in vehicle_ids])
+    ends = np.array([trails[vehicle_id][-1] for vehicle_id in vehicle_ids])
+    start = match_vehicles(geometry, trip, starts[:, 0], starts[:, 1])
+    end = match_vehicles(geometry, trip, ends[:, 0], ends[:, 1])
+    codes = shape_codes(geometry, trip)
+
+    followed = dict(trails)
+    for i in np.flatnonzero(start.matched & end.matched & (end.dist_along > start.dist_along)):
+        followed[vehicle_ids[i]] = path_along(geometry, codes[i], start.dist_along[i], end.dist_along[i])
+    return followed
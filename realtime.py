@@ -3,114 +3,96 @@ import folium
 from streamlit_folium import folium_static
 from folium.features import DivIcon
 from folium.plugins import AntPath
-import requests
 import pandas as pd
-from google.transit import gtfs_realtime_pb2
 from datetime import datetime, timedelta
 import pytz
 from streamlit_autorefresh import st_autorefresh
 import streamlit.components.v1 as components
 
+import diagnostics
+import gtfs_cache
+import map_matching
+import rt_facets
+import rt_pipeline
+import rt_poller
+import rt_render
+import rt_tracker
+import spatial_index
+import tracing
+
 # --- Constants ---
-VEHICLE_POSITIONS_URL = "https://gtfsrt.api.translink.com.au/api/realtime/SEQ/VehiclePositions/Bus"
-TRIP_UPDATES_URL = "https://gtfsrt.api.translink.com.au/api/realtime/SEQ/TripUpdates/Bus"
 BRISBANE_TZ = pytz.timezone('Australia/Brisbane')
 REFRESH_INTERVAL_SECONDS = 60
+# A snapshot published by rt_poller.py is used while it is younger than this
+SNAPSHOT_MAX_AGE_SECONDS = 2 * REFRESH_INTERVAL_SECONDS
 
 # Set a wide layout for the app
 st.set_page_config(layout="wide")
 
-# --- Data Fetching & Processing Functions (No changes here) ---
+# --- Data Fetching & Processing Functions ---
 
-@st.cache_data(ttl=REFRESH_INTERVAL_SECONDS)
 def get_live_bus_data() -> tuple[pd.DataFrame, datetime]:
     """
-    Fetches, merges, and processes vehicle and trip data.
-    Returns the DataFrame and the time of the data refresh.
+    Returns the latest vehicle DataFrame and the time it was fetched.
+    Reads the snapshot published by rt_poller.py when one is fresh, and
+    only fetches the feeds in-process when no poller is running.
     """
-    vehicle_content = fetch_gtfs_rt(VEHICLE_POSITIONS_URL)
-    trip_content = fetch_gtfs_rt(TRIP_UPDATES_URL)
-
-    if not vehicle_content or not trip_content:
-        return pd.DataFrame(), datetime.now(BRISBANE_TZ)
-
-    vehicles_df = parse_vehicle_positions(vehicle_content)
-    updates_df = parse_trip_updates(trip_content)
-
-    if vehicles_df.empty:
-        return pd.DataFrame(), datetime.now(BRISBANE_TZ)
-
-    live_data = vehicles_df.merge(updates_df, on="trip_id", how="left")
-    live_data["delay"].fillna(0, inplace=True)
-    live_data["status"].fillna("On Time", inplace=True)
-    live_data["route_name"] = live_data["route_id"].str.split('-').str[0]
+    snapshot = rt_poller.read_snapshot(SNAPSHOT_MAX_AGE_SECONDS)
+    tracing.record_cache("poller_snapshot", hit=snapshot is not None)
+    if snapshot is not None:
+        return snapshot
+    return tracing.cached_call("fetch_live_bus_data", fetch_live_bus_data)
+
+@st.cache_resource
+def get_vehicle_tracker() -> rt_tracker.VehicleTracker:
+    """
+    One movement history shared by every session, instead of a copy of
+    the previous snapshot per session.
+    """
+    return rt_tracker.VehicleTracker(rt_tracker.TRAIL_LENGTH)
 
-    def categorize_region(lat):
-        if -27.75 <= lat <= -27.0:
-            return "Brisbane"
-        elif -28.2 <= lat <= -27.78:
-            return "Gold Coast"
-        elif -26.9 <= lat <= -26.3:
-            return "Sunshine Coast"
-        else:
-            return "Other"
+@st.cache_resource(max_entries=2)
+def get_vehicle_index(fetched_at, _df) -> spatial_index.GridIndex:
+    """
+    Spatial index over the snapshot's vehicles, rebuilt once per poll and
+    shared by every session viewing that snapshot.
+    """
+    return spatial_index.build_grid_index(_df['lat'], _df['lon'])
 
-    live_data["region"] = live_data["lat"].apply(categorize_region)
+@st.cache_resource(max_entries=2)
+def get_facets(fetched_at, _df) -> rt_facets.FacetIndex:
+    """
+    Region -> route -> status -> vehicle groups for the sidebar filters,
+    built once per snapshot and shared by every session.
+    """
+    return rt_facets.build_facets(_df)
 
-    return live_data, datetime.now(BRISBANE_TZ)
+def facet_selection(value):
+    """A single-choice filter value as a facet selection; "All" selects everything."""
+    return None if value == "All" else {value}
 
-def fetch_gtfs_rt(url: str) -> bytes | None:
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        return response.content
-    except requests.RequestException as e:
-        st.error(f"Couldn't fetch data from the API: {e}")
+@st.cache_resource(max_entries=1, show_spinner="Loading route shapes...")
+def load_shape_geometry(feed_key) -> map_matching.ShapeGeometry | None:
+    """
+    Shapes and trip -> shape lookup for map matching, built from the static
+    feed cached by gtfs_static.py; None if that cache is missing.
+    """
+    tables = gtfs_cache.load_tables(feed_key, tables=["shapes.txt", "trips.txt"])
+    if tables is None:
         return None
+    return map_matching.build_shape_geometry(tables["shapes.txt"], tables["trips.txt"])
 
-def parse_vehicle_positions(content: bytes) -> pd.DataFrame:
-    feed = gtfs_realtime_pb2.FeedMessage()
-    feed.ParseFromString(content)
-
-    vehicles = []
-    for entity in feed.entity:
-        if entity.HasField("vehicle"):
-            v = entity.vehicle
-            vehicles.append({
-                "trip_id": v.trip.trip_id,
-                "route_id": v.trip.route_id,
-                "vehicle_id": v.vehicle.label,
-                "lat": v.position.latitude,
-                "lon": v.position.longitude,
-                "stop_sequence": v.current_stop_sequence,
-                "stop_id": v.stop_id,
-                "current_status": v.current_status,
-                "timestamp": datetime.fromtimestamp(v.timestamp, BRISBANE_TZ).strftime('%Y-%m-%d %H:%M:%S %Z') if v.HasField("timestamp") else "N/A"
-            })
-    return pd.DataFrame(vehicles)
-
-def parse_trip_updates(content: bytes) -> pd.DataFrame:
-    feed = gtfs_realtime_pb2.FeedMessage()
-    feed.ParseFromString(content)
-
-    updates = []
-    for entity in feed.entity:
-        if entity.HasField("trip_update"):
-            tu = entity.trip_update
-            if tu.stop_time_update:
-                delay = tu.stop_time_update[0].arrival.delay
-                status = "On Time"
-                if delay > 300:
-                    status = "Delayed"
-                elif delay < -60:
-                    status = "Early"
-
-                updates.append({
-                    "trip_id": tu.trip.trip_id,
-                    "delay": delay,
-                    "status": status
-                })
-    return pd.DataFrame(updates)
+@st.cache_data(ttl=REFRESH_INTERVAL_SECONDS)
+def fetch_live_bus_data() -> tuple[pd.DataFrame, datetime]:
+    """
+    Fetches, merges, and processes vehicle and trip data.
+    Returns the DataFrame and the time of the data refresh.
+    """
+    tracing.record_cache("fetch_live_bus_data", hit=False)
+    live_data, errors = rt_pipeline.fetch_live_snapshot(rt_pipeline.FEED_MODES)
+    for error in errors:
+        st.error(f"Couldn't fetch data from the API: {error}")
+    return live_data, datetime.now(BRISBANE_TZ)
 
 
 # --- Streamlit App UI ---
@@ -121,24 +103,18 @@ st.title("🚌 SEQ Live Bus Tracker")
 st_autorefresh(interval=REFRESH_INTERVAL_SECONDS * 1000, key="data_refresher")
 
 # Fetch current data and the time it was refreshed
-current_df, last_refreshed_time = get_live_bus_data()
-previous_df = st.session_state.get('previous_df', pd.DataFrame())
-
-# Merge current data with previous locations to track movement
-if not previous_df.empty:
-    prev_locations = previous_df[['vehicle_id', 'lat', 'lon']]
-    master_df = current_df.merge(
-        prev_locations, on='vehicle_id', how='left', suffixes=('', '_prev')
-    )
-else:
-    master_df = current_df
-    master_df['lat_prev'] = pd.NA
-    master_df['lon_prev'] = pd.NA
+master_df, last_refreshed_time = get_live_bus_data()
 
 if master_df.empty:
     st.warning("Could not retrieve live bus data. Please try again later.")
     st.stop()
 
+# Record this snapshot's positions; a no-op if another session already did
+tracker = get_vehicle_tracker()
+movement = tracker.update(master_df, last_refreshed_time)
+
+facets = get_facets(last_refreshed_time, master_df)
+
 # --- Initialize session state for filters if they don't exist ---
 if 'selected_region' not in st.session_state:
     st.session_state['selected_region'] = 'Gold Coast'
@@ -155,7 +131,7 @@ with st.sidebar:
     st.header("Filters")
     with st.form("filter_form"):
         # 1. REGION FILTER
-        region_options = ["All"] + sorted(master_df["region"].unique().tolist())
+        region_options = ["All"] + rt_facets.options(facets, [])
         # Set index based on session state
         try:
             region_index = region_options.index(st.session_state['selected_region'])
@@ -164,8 +140,8 @@ with st.sidebar:
         selected_region = st.selectbox("Region", region_options, index=region_index)
 
         # 2. ROUTE FILTER
-        df_after_region = master_df[master_df["region"] == selected_region] if selected_region != "All" else master_df
-        route_options = ["All"] + sorted(df_after_region["route_name"].unique().tolist())
+        region_selection = facet_selection(selected_region)
+        route_options = ["All"] + rt_facets.options(facets, [region_selection])
         # Check if saved route is still valid, otherwise reset
         if st.session_state['selected_route'] not in route_options:
             st.session_state['selected_route'] = "All"
@@ -176,13 +152,13 @@ with st.sidebar:
         selected_route = st.selectbox("Route", route_options, index=route_index)
 
         # 3. STATUS FILTER
-        df_after_route = df_after_region[df_after_region["route_name"] == selected_route] if selected_route != "All" else df_after_region
-        status_options = sorted(df_after_route["status"].unique().tolist())
+        route_selection = facet_selection(selected_route)
+        status_options = rt_facets.options(facets, [region_selection, route_selection])
         selected_status = st.multiselect("Status", status_options, default=st.session_state['selected_status'])
 
         # 4. VEHICLE ID FILTER
-        df_after_status = df_after_route[df_after_route["status"].isin(selected_status)] if selected_status else df_after_route
-        vehicle_options = ["All"] + sorted(df_after_status["vehicle_id"].unique().tolist())
+        status_selection = set(selected_status) or None
+        vehicle_options = ["All"] + rt_facets.options(facets, [region_selection, route_selection, status_selection])
         if st.session_state['selected_vehicle'] not in vehicle_options:
             st.session_state['selected_vehicle'] = 'All'
         try:
@@ -201,16 +177,19 @@ with st.sidebar:
             st.session_state['selected_vehicle'] = selected_vehicle
             st.rerun() # Rerun to apply selections immediately
 
-# Use session state values to filter the dataframe
-filtered_df = master_df
-if st.session_state['selected_region'] != "All":
-    filtered_df = filtered_df[filtered_df['region'] == st.session_state['selected_region']]
-if st.session_state['selected_route'] != "All":
-    filtered_df = filtered_df[filtered_df['route_name'] == st.session_state['selected_route']]
-if st.session_state['selected_status']:
-    filtered_df = filtered_df[filtered_df['status'].isin(st.session_state['selected_status'])]
-if st.session_state['selected_vehicle'] != "All":
-    filtered_df = filtered_df[filtered_df['vehicle_id'] == st.session_state['selected_vehicle']]
+    # deck.gl sends all vehicles as one data layer; Folium builds a marker per bus
+    map_renderer = st.radio("Map renderer", ["deck.gl", "Folium"], key="map_renderer", horizontal=True)
+    show_labels = st.checkbox("Show vehicle labels", value=True, key="show_labels")
+    snap_to_route = st.checkbox("Snap buses to their route", value=True, key="snap_to_route")
+
+# Use session state values to select the rows from the facet groups
+with tracing.span("filter"):
+    filtered_df = master_df.iloc[rt_facets.rows(facets, [
+        facet_selection(st.session_state['selected_region']),
+        facet_selection(st.session_state['selected_route']),
+        set(st.session_state['selected_status']) or None,
+        facet_selection(st.session_state['selected_vehicle']),
+    ])]
 
 
 # --- Display stats and map ---
@@ -219,6 +198,7 @@ if st.session_state['selected_vehicle'] != "All":
 col1, col2, col3, col4 = st.columns(4)
 with col1:
     st.metric("Buses Currently Tracked", len(filtered_df))
+    st.caption(f"{len(movement.moved)} moved, {len(movement.appeared)} appeared, {len(movement.disappeared)} gone since last refresh")
 with col2:
     st.metric("Last Refreshed", last_refreshed_time.strftime('%I:%M:%S %p %Z'))
 with col3:
@@ -271,64 +251,101 @@ st.markdown(
 
 # --- Map rendering ---
 if not filtered_df.empty:
-    map_center = [filtered_df['lat'].mean(), filtered_df['lon'].mean()]
-    m = folium.Map(location=map_center, zoom_start=12)
-
-    for _, row in filtered_df.iterrows():
-        # --- Draw the animated path for buses that have moved ---
-        if pd.notna(row['lat_prev']) and (row['lat'] != row['lat_prev'] or row['lon'] != row['lon_prev']):
-            AntPath(
-                locations=[[row['lat_prev'], row['lon_prev']], [row['lat'], row['lon']]],
-                color="blue",
-                weight=5,
-                delay=800,
-                dash_array=[10, 20]
-            ).add_to(m)
+    # Format timestamps only for the vehicles that are displayed
+    filtered_df = filtered_df.assign(last_update=rt_pipeline.format_timestamps(filtered_df['timestamp']))
+    trails = tracker.trails(filtered_df['vehicle_id'])
+
+    # Snap fixes onto their trip's shape and draw trails along the road
+    static_feed_key = gtfs_cache.latest_key()
+    shape_geometry = load_shape_geometry(static_feed_key) if snap_to_route and static_feed_key else None
+    if shape_geometry is not None:
+        matches = map_matching.match_vehicles(shape_geometry, filtered_df['trip_id'], filtered_df['lat'], filtered_df['lon'])
+        filtered_df = filtered_df.assign(lat=matches.snapped_lat, lon=matches.snapped_lon, dist_along_m=matches.dist_along.round())
+        trails = map_matching.trails_along_shapes(
+            shape_geometry, trails, dict(zip(filtered_df['vehicle_id'], filtered_df['trip_id']))
+        )
+    elif snap_to_route:
+        st.caption("Open the static route viewer once to cache route shapes for snapping.")
 
-        # --- Draw the bus icon and its label ---
-        color = "green"
-        if row['status'] == 'Delayed':
-            color = "red"
-        elif row['status'] == 'Early':
-            color = "blue"
-
-        popup_html = f"""
-        <b>Route:</b> {row['route_name']} ({row['route_id']})<br>
-        <b>Vehicle ID:</b> {row['vehicle_id']}<br>
-        <b>Status:</b> {row['status']}<br>
-        <b>Delay:</b> {int(row['delay'])} seconds<br>
-        <b>Last Update:</b> {row['timestamp']}
-        """
-        folium.Marker(
-            [row['lat'], row['lon']],
-            popup=folium.Popup(popup_html, max_width=300),
-            icon=folium.Icon(color=color, icon="bus", prefix="fa")
-        ).add_to(m)
-
-        label_text = f"vehicle: {row['vehicle_id']} on stop_seq: {row['stop_sequence']}"
-        label_icon = DivIcon(
-            icon_size=(200, 36),
-            icon_anchor=(85, 15),
-            html=f"""
-            <div style="font-size: 10pt; font-weight: bold; color: {color}; background-color: #f5f5f5;
-                        padding: 4px 8px; border: 1px solid {color}; border-radius: 5px;
-                        box-shadow: 3px 3px 5px rgba(0,0,0,0.3); white-space: nowrap;">
-                {label_text}
-            </div>
+if filtered_df.empty:
+    st.info("No buses match the current filter criteria.")
+elif map_renderer == "deck.gl":
+    with tracing.span("render_map"):
+        st.pydeck_chart(rt_render.vehicle_deck(filtered_df, trails, show_labels), height=700, use_container_width=True)
+else:
+    with tracing.span("render_map"):
+        map_center = [filtered_df['lat'].mean(), filtered_df['lon'].mean()]
+        m = folium.Map(location=map_center, zoom_start=12)
+
+        for _, row in filtered_df.iterrows():
+            # --- Draw the animated trail of the bus's recent positions ---
+            if row['vehicle_id'] in trails:
+                AntPath(
+                    locations=trails[row['vehicle_id']],
+                    color="blue",
+                    weight=5,
+                    delay=800,
+                    dash_array=[10, 20]
+                ).add_to(m)
+
+            # --- Draw the bus icon and its label ---
+            color = "green"
+            if row['status'] == 'Delayed':
+                color = "red"
+            elif row['status'] == 'Early':
+                color = "blue"
+
+            popup_html = f"""
+            <b>Route:</b> {row['route_name']} ({row['route_id']})<br>
+            <b>Vehicle ID:</b> {row['vehicle_id']}<br>
+            <b>Status:</b> {row['status']}<br>
+            <b>Delay:</b> {int(row['delay'])} seconds<br>
+            <b>Last Update:</b> {row['last_update']}
             """
-        )
-        folium.Marker(
-            location=[row['lat'], row['lon']],
-            icon=label_icon
-        ).add_to(m)
+            folium.Marker(
+                [row['lat'], row['lon']],
+                popup=folium.Popup(popup_html, max_width=300),
+                icon=folium.Icon(color=color, icon="bus", prefix="fa")
+            ).add_to(m)
 
-    folium_static(m, width=1400, height=700)
+            if not show_labels:
+                continue
+            label_text = f"vehicle: {row['vehicle_id']} on stop_seq: {row['stop_sequence']}"
+            label_icon = DivIcon(
+                icon_size=(200, 36),
+                icon_anchor=(85, 15),
+                html=f"""
+                <div style="font-size: 10pt; font-weight: bold; color: {color}; background-color: #f5f5f5;
+                            padding: 4px 8px; border: 1px solid {color}; border-radius: 5px;
+                            box-shadow: 3px 3px 5px rgba(0,0,0,0.3); white-space: nowrap;">
+                    {label_text}
+                </div>
+                """
+            )
+            folium.Marker(
+                location=[row['lat'], row['lon']],
+                icon=label_icon
+            ).add_to(m)
 
-    with st.expander("Show Raw Data"):
-        st.dataframe(filtered_df[['vehicle_id', 'route_name', 'status', 'delay', 'region', 'timestamp']])
-else:
-    st.info("No buses match the current filter criteria.")
+        folium_static(m, width=1400, height=700)
 
+if st.session_state['selected_vehicle'] != "All" and not filtered_df.empty:
+    with st.expander("Nearby Buses"):
+        vehicle = filtered_df.iloc[0]
+        positions, distances = spatial_index.knn(
+            get_vehicle_index(last_refreshed_time, master_df), vehicle['lat'], vehicle['lon'], k=6
+        )
+        nearby_df = master_df.iloc[positions].assign(distance_m=distances.round())
+        nearby_df = nearby_df[nearby_df['vehicle_id'] != vehicle['vehicle_id']].head(5)
+        st.dataframe(nearby_df[['vehicle_id', 'route_name', 'status', 'distance_m']])
 
-# --- Save current data to session state for the next refresh ---
-st.session_state['previous_df'] = current_df
+if not filtered_df.empty:
+    with st.expander("Show Raw Data"):
+        raw_columns = ['vehicle_id', 'route_name', 'status', 'delay', 'region', 'last_update']
+        if 'dist_along_m' in filtered_df:
+            raw_columns.append('dist_along_m')
+        st.dataframe(filtered_df[raw_columns])
+
+# Rendered last so it includes this run's filter and map timings
+with st.sidebar:
+    diagnostics.render_diagnostics_panel()
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+# Region definitions, checked in order: the first region containing a point wins.
+# A region is either a bounding box ("lat"/"lon" ranges, inclusive) or a
+# "polygon" of (lat, lon) vertices.
+REGIONS = {
+    "Gold Coast": {"lat": (-28.2, -27.8), "lon": (153.2, 153.5)},
+    "Brisbane": {"lat": (-27.7, -27.2), "lon": (152.8, 153.5)},
+    "Sunshine Coast": {"lat": (-27.2, -26.3), "lon": (152.8, 153.3)},
+}
+DEFAULT_REGION = "Other"
+
+
+def region_names(regions=REGIONS):
+    """Return every label the classifier can produce, in config order."""
+    return list(regions) + [DEFAULT_REGION]
+
+
+def _in_bbox(bounds, lat, lon):
+    lat_min, lat_max = bounds["lat"]
+    lon_min, lon_max = bounds["lon"]
+    return (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+
+
+def _in_polygon(polygon, lat, lon):
+    """Even-odd ray casting, vectorised over points and looped over edges."""
+    vertices = np.asarray(polygon, dtype=np.float64)
+    poly_lat, poly_lon = vertices[:, 0], vertices[:, 1]
+
+    # Only test points inside the polygon's bounding box
+    candidates = np.flatnonzero(
+        (lat >= poly_lat.min()) & (lat <= poly_lat.max()) & (lon >= poly_lon.min()) & (lon <= poly_lon.max())
+    )
+    y, x = lat[candidates], lon[candidates]
+    inside = np.zeros(len(candidates), dtype=bool)
+
+    j = len(vertices) - 1
+    for i in range(len(vertices)):
+        yi, xi, yj, xj = poly_lat[i], poly_lon[i], poly_lat[j], poly_lon[j]
+        crosses = (yi > y) != (yj > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = (xj - xi) * (y - yi) / (yj - yi) + xi
+        inside ^= crosses & (x < x_cross)
+        j = i
+
+    result = np.zeros(lat.shape, dtype=bool)
+    result[candidates] = inside
+    return result
+
+
+def classify_points(lat, lon, regions=REGIONS):
+    """Label every (lat, lon) point with its region in one vectorised pass.
+
+    Accepts arrays or Series and returns a pandas Categorical whose
+    categories are region_names(regions). Points outside every region,
+    including NaN coordinates, are labelled DEFAULT_REGION.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+
+    codes = np.full(lat.shape, len(regions), dtype=np.int8)
+    unassigned = np.ones(lat.shape, dtype=bool)
+    for code, spec in enumerate(regions.values()):
+        if "polygon" in spec:
+            inside = _in_polygon(spec["polygon"], lat, lon)
+        else:
+            inside = _in_bbox(spec, lat, lon)
+        codes[inside & unassigned] = code
+        unassigned &= ~inside
+
+    return pd.Categorical.from_codes(codes, categories=region_names(regions))
+
+
+def sql_case(lat_column, lon_column, regions=REGIONS):
+    """Return a Postgres CASE expression that labels rows the same way as classify_points.
+
+    Column names are trusted identifiers; polygons use the built-in
+    geometric `point <@ polygon` operator, so PostGIS is not needed.
+    """
+    lat = f"({lat_column})::float8"
+    lon = f"({lon_column})::float8"
+    branches = []
+    for name, spec in regions.items():
+        if "polygon" in spec:
+            vertices = ",".join(f"({v_lon!r},{v_lat!r})" for v_lat, v_lon in spec["polygon"])
+            condition = f"point({lon}, {lat}) <@ polygon '({vertices})'"
+        else:
+            (lat_min, lat_max), (lon_min, lon_max) = spec["lat"], spec["lon"]
+            condition = f"{lat} BETWEEN {lat_min!r} AND {lat_max!r} AND {lon} BETWEEN {lon_min!r} AND {lon_max!r}"
+        label = name.replace("'", "''")
+        branches.append(f"WHEN {condition} THEN '{label}'")
+
+    default = DEFAULT_REGION.replace("'", "''")
+    return f"CASE {' '.join(branches)} ELSE '{default}' END"
@@ -0,0 +1,228 @@
+"""Serve recorded GTFS-RT feeds and the static GTFS ZIP as a local stand-in for the live APIs.
+
+Record a sequence of polls, then replay them on a schedule:
+
+    python replay_server.py --record recordings --count 20 --interval 30
+    python replay_server.py --recordings recordings --static-zip gtfs.zip --interval 30 --scale 10 --latency 200
+
+and point the dashboard and poller at it:
+
+    GTFS_RT_BASE_URL=http://localhost:8765/api/realtime/SEQ GTFS_ZIP_URL=http://localhost:8765/gtfs.zip
+
+A recording is a directory of frames, each holding <FeedType>_<Mode>.pb
+files as written by benchmarks/bench_rt_parse.py --record; a directory
+holding the .pb files directly is served as a single frame.
+"""
+import argparse
+import hashlib
+import os
+import random
+import re
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google.transit import gtfs_realtime_pb2
+
+import rt_fetch
+
+DEFAULT_PORT = 8765
+FEED_PATH = re.compile(r"^/api/realtime/SEQ/(?P<feed_type>\w+)/(?P<mode>\w+)/?$")
+STATIC_PATH = "/gtfs.zip"
+# Offset, in degrees, between the copies of a vehicle made by --scale
+SCALE_JITTER_DEGREES = 0.0005
+
+
+def scale_feed(content, factor):
+    """Multiply the vehicles and trips in a feed `factor` times, with distinct ids.
+
+    Copies suffix entity, vehicle and trip ids with -x<k>, so scaled
+    VehiclePositions and TripUpdates still join on trip_id, and shift
+    copied positions slightly so they don't stack on the original.
+    """
+    if factor <= 1:
+        return content
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(content)
+
+    originals = list(feed.entity)
+    for k in range(1, factor):
+        suffix = f"-x{k}"
+        for original in originals:
+            entity = feed.entity.add()
+            entity.CopyFrom(original)
+            entity.id += suffix
+            if entity.HasField("vehicle"):
+                vehicle = entity.vehicle
+                vehicle.trip.trip_id += suffix
+                vehicle.vehicle.id += suffix
+                vehicle.vehicle.label += suffix
+                vehicle.position.latitude += k * SCALE_JITTER_DEGREES
+                vehicle.position.longitude += k * SCALE_JITTER_DEGREES
+            if entity.HasField("trip_update"):
+                entity.trip_update.trip.trip_id += suffix
+                entity.trip_update.vehicle.id += suffix
+                entity.trip_update.vehicle.label += suffix
+    return feed.SerializeToString()
+
+
+def load_frames(directory, scale=1):
+    """Read every frame of a recording as [{(feed_type, mode): bytes}], scaled up front."""
+    frame_dirs = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if os.path.isdir(os.path.join(directory, name))
+    ) or [directory]
+
+    frames = []
+    for frame_dir in frame_dirs:
+        frame = {}
+        for name in os.listdir(frame_dir):
+            feed_type, _, rest = name.partition("_")
+            mode, ext = os.path.splitext(rest)
+            if ext != ".pb":
+                continue
+            with open(os.path.join(frame_dir, name), "rb") as f:
+                frame[(feed_type, mode)] = scale_feed(f.read(), scale)
+        if frame:
+            frames.append(frame)
+    return frames
+
+
+def record(directory, count, interval, modes):
+    """Save `count` polls of the live feeds, `interval` seconds apart, as numbered frames."""
+    next_run = time.monotonic()
+    for i in range(count):
+        frame_dir = os.path.join(directory, f"{i:06d}")
+        os.makedirs(frame_dir, exist_ok=True)
+        urls = {
+            (feed_type, mode): rt_fetch.feed_url(feed_type, mode)
+            for mode in modes
+            for feed_type in (rt_fetch.VEHICLE_POSITIONS, rt_fetch.TRIP_UPDATES)
+        }
+        contents, errors = rt_fetch.fetch_feeds(urls)
+        for (feed_type, mode), content in contents.items():
+            with open(os.path.join(frame_dir, f"{feed_type}_{mode}.pb"), "wb") as f:
+                f.write(content)
+        for key, error in errors.items():
+            print(f"frame {i}: {key} failed: {error}")
+        print(f"recorded {frame_dir}")
+
+        next_run += interval
+        if i + 1 < count:
+            time.sleep(max(0.0, next_run - time.monotonic()))
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """Serves frame floor(elapsed / interval) of the recording, looping at the end."""
+
+    daemon_threads = True
+
+    def __init__(self, address, frames, interval, static_zip=None, latency=0.0, jitter=0.0):
+        super().__init__(address, ReplayHandler)
+        self.frames = frames
+        self.interval = interval
+        self.latency = latency
+        self.jitter = jitter
+        self.started = time.monotonic()
+        self.static_zip = None
+        if static_zip:
+            with open(static_zip, "rb") as f:
+                self.static_zip = f.read()
+            self.static_etag = f'"{hashlib.sha256(self.static_zip).hexdigest()[:16]}"'
+            self.static_modified = formatdate(os.path.getmtime(static_zip), usegmt=True)
+
+    def current_frame(self):
+        elapsed = time.monotonic() - self.started
+        index = int(elapsed // self.interval) if self.interval > 0 else 0
+        return index % len(self.frames), self.frames[index % len(self.frames)]
+
+    def simulated_delay(self):
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(self.server.simulated_delay())
+        if self.path == STATIC_PATH:
+            self._send_static()
+            return
+
+        match = FEED_PATH.match(self.path)
+        if match is None:
+            self._send(404, b"not found", "text/plain")
+            return
+        index, frame = self.server.current_frame()
+        content = frame.get((match["feed_type"], match["mode"]))
+        if content is None:
+            self._send(404, b"feed not recorded", "text/plain")
+            return
+        self._send(200, content, "application/octet-stream", {"X-Replay-Frame": str(index)})
+
+    def _send_static(self):
+        server = self.server
+        if server.static_zip is None:
+            self._send(404, b"no static ZIP configured", "text/plain")
+            return
+        headers = {"ETag": server.static_etag, "Last-Modified": server.static_modified, "Accept-Ranges": "bytes"}
+        if self.headers.get("If-None-Match") == server.static_etag:
+            self._send(304, b"", "application/zip", headers)
+            return
+
+        # gtfs_download resumes partial downloads with "Range: bytes=<offset>-"
+        range_match = re.match(r"bytes=(\d+)-$", self.headers.get("Range", ""))
+        if range_match and self.headers.get("If-Range", server.static_etag) == server.static_etag:
+            offset = int(range_match[1])
+            if offset >= len(server.static_zip):
+                self._send(416, b"", "application/zip", {"Content-Range": f"bytes */{len(server.static_zip)}"})
+                return
+            headers["Content-Range"] = f"bytes {offset}-{len(server.static_zip) - 1}/{len(server.static_zip)}"
+            self._send(206, server.static_zip[offset:], "application/zip", headers)
+            return
+        self._send(200, server.static_zip, "application/zip", headers)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recordings", help="recording directory to serve")
+    parser.add_argument("--record", metavar="DIR", help="record live polls into DIR instead of serving")
+    parser.add_argument("--count", type=int, default=10, help="polls to record")
+    parser.add_argument("--modes", nargs="+", default=["Bus"])
+    parser.add_argument("--interval", type=float, default=30, help="seconds per frame (recording and replay)")
+    parser.add_argument("--static-zip", help="GTFS ZIP to serve at /gtfs.zip")
+    parser.add_argument("--scale", type=int, default=1, help="multiply the fleet in every frame")
+    parser.add_argument("--latency", type=float, default=0, help="added response latency in ms")
+    parser.add_argument("--jitter", type=float, default=0, help="random +/- latency in ms")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.count, args.interval, args.modes)
+        return
+    if not args.recordings:
+        parser.error("--recordings or --record is required")
+
+    frames = load_frames(args.recordings, args.scale)
+    if not frames:
+        parser.error(f"no .pb feeds found in {args.recordings}")
+    server = ReplayServer(
+        (args.host, args.port), frames, args.interval, args.static_zip, args.latency / 1000, args.jitter / 1000
+    )
+    print(f"Serving {len(frames)} frames every {args.interval}s at http://{args.host}:{args.port}/api/realtime/SEQ")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
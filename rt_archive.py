@@ -0,0 +1,137 @@
+"""Append-only archive of GTFS-RT snapshots, partitioned by hour, with replay.
+
+rt_poller.py archives every poll when run with --archive, and publishes a
+replayed range to the dashboard with --replay-start/--replay-end.
+"""
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import rt_pipeline
+
+ARCHIVE_DIR = os.environ.get("RT_ARCHIVE_DIR", ".rt_archive")
+COMPRESSION = "zstd"
+# Replayed vehicles drop out once their last fix is this much older than the replay clock
+STALE_AFTER_SECONDS = 300
+# How far back a restarted Archiver looks for each vehicle's last archived fix
+SEED_WINDOW_SECONDS = 3600
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string()), ("hour", pa.string())]), flavor="hive")
+
+
+def _partition_dir(fetched_at, archive_dir):
+    utc = fetched_at.astimezone(timezone.utc)
+    return os.path.join(archive_dir, f"date={utc:%Y-%m-%d}", f"hour={utc:%H}")
+
+
+def _partition_dates(start, end):
+    """UTC partition dates covering [start, end)."""
+    day = start.astimezone(timezone.utc).date()
+    last = end.astimezone(timezone.utc).date()
+    dates = []
+    while day <= last:
+        dates.append(day.isoformat())
+        day += timedelta(days=1)
+    return dates
+
+
+class Archiver:
+    """Writes each poll as one Parquet file, keeping only fixes not archived before.
+
+    A fix is identified by (vehicle_id, timestamp); vehicles that have not
+    reported a new position since the last poll are not written again.
+    """
+
+    def __init__(self, archive_dir=ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        self._last_timestamps = pd.Series(dtype="int64")
+        self._seed()
+
+    def _seed(self):
+        """Resume deduplication after a restart from the last SEED_WINDOW_SECONDS of polls.
+
+        Reading only the newest poll would re-archive every vehicle that
+        was missing from it.
+        """
+        files = {
+            int(name[:-len(".parquet")]): os.path.join(root, name)
+            for root, _, names in os.walk(self.archive_dir)
+            for name in names if name.endswith(".parquet")
+        }
+        if not files:
+            return
+        newest = max(files)
+        recent = [path for fetched_at, path in files.items() if fetched_at >= newest - SEED_WINDOW_SECONDS]
+        seen = pa.concat_tables([pq.read_table(path, columns=["vehicle_id", "timestamp"]) for path in recent]).to_pandas()
+        self._last_timestamps = seen.groupby("vehicle_id")["timestamp"].max()
+
+    def append(self, df, fetched_at):
+        """Archive the new fixes in a snapshot; returns how many rows were written."""
+        df = df.drop_duplicates(["vehicle_id", "timestamp"], keep="last")
+        previous = self._last_timestamps.reindex(df["vehicle_id"]).to_numpy()
+        new = df[pd.isna(previous) | (previous != df["timestamp"].to_numpy())]
+        if new.empty:
+            return 0
+
+        new = new.assign(fetched_at=int(fetched_at.timestamp()))
+        directory = _partition_dir(fetched_at, self.archive_dir)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{int(fetched_at.timestamp())}.parquet")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pq.write_table(pa.Table.from_pandas(new, preserve_index=False), tmp_path, compression=COMPRESSION)
+        os.replace(tmp_path, path)
+
+        latest = new.set_index("vehicle_id")["timestamp"]
+        self._last_timestamps = pd.concat([self._last_timestamps, latest])
+        self._last_timestamps = self._last_timestamps[~self._last_timestamps.index.duplicated(keep="last")]
+        return len(new)
+
+
+def read_range(start, end, archive_dir=ARCHIVE_DIR):
+    """All archived rows fetched in [start, end), ordered by fetch time."""
+    if not os.path.isdir(archive_dir):
+        return pd.DataFrame()
+    dataset = ds.dataset(archive_dir, format="parquet", partitioning=PARTITIONING, exclude_invalid_files=True)
+    start_s, end_s = int(start.timestamp()), int(end.timestamp())
+    # The date filter prunes whole partitions before the exact fetch time filter
+    table = dataset.to_table(filter=(
+        ds.field("date").isin(_partition_dates(start, end))
+        & (ds.field("fetched_at") >= start_s)
+        & (ds.field("fetched_at") < end_s)
+    ))
+    df = table.to_pandas()
+    if df.empty:
+        return df
+    return df.drop(columns=["date", "hour"], errors="ignore").sort_values("fetched_at", kind="stable")
+
+
+def replay(start, end, speed=1.0, archive_dir=ARCHIVE_DIR):
+    """Yield (snapshot DataFrame, fetched_at) for every archived poll in [start, end).
+
+    Each snapshot is rebuilt as the live pipeline produced it: every
+    vehicle's latest fix, dropped once it is STALE_AFTER_SECONDS old.
+    Polls are paced at `speed` times real time; None or 0 replays as fast
+    as possible.
+    """
+    # Start early enough to know which vehicles were already on the road
+    rows = read_range(start - timedelta(seconds=STALE_AFTER_SECONDS), end, archive_dir)
+    if rows.empty:
+        return
+
+    state = rows.iloc[:0]
+    previous_poll = None
+    start_s = int(start.timestamp())
+    for poll, poll_rows in rows.groupby("fetched_at", sort=True):
+        state = pd.concat([state, poll_rows]).drop_duplicates("vehicle_id", keep="last")
+        state = state[state["timestamp"] >= poll - STALE_AFTER_SECONDS]
+        if poll < start_s:
+            continue
+
+        if speed and previous_poll is not None:
+            time.sleep((poll - previous_poll) / speed)
+        previous_poll = poll
+        yield state.drop(columns="fetched_at").reset_index(drop=True), datetime.fromtimestamp(poll, rt_pipeline.BRISBANE_TZ)
@@ -0,0 +1,84 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# Sidebar filter levels, outermost first
+FACET_COLUMNS = ("region", "route_name", "status", "vehicle_id")
+
+
+class FacetIndex(NamedTuple):
+    """Rows sorted by the facet columns, with the row range of every facet group.
+
+    children[level] maps the values chosen for the levels above (a tuple)
+    to {value: (start, end)} ranges in `order`, sorted by value.
+    """
+
+    columns: tuple
+    # Row positions sorted by the facet columns in turn
+    order: np.ndarray
+    children: list
+
+
+def build_facets(df, columns=FACET_COLUMNS) -> FacetIndex:
+    """Group the snapshot by every prefix of `columns` in one sort."""
+    codes, uniques = [], []
+    for column in columns:
+        column_codes, column_uniques = pd.factorize(df[column].astype(object), sort=True)
+        codes.append(column_codes)
+        uniques.append(np.asarray(column_uniques, dtype=object))
+
+    # lexsort sorts by the last key first
+    order = np.lexsort(codes[::-1]) if len(df) else np.empty(0, dtype=np.int64)
+    sorted_codes = [column_codes[order] for column_codes in codes]
+
+    children = []
+    changed = np.zeros(len(order), dtype=bool)
+    if len(order):
+        changed[0] = True
+    for level in range(len(columns)):
+        # A group at this level starts wherever any code up to this level changes
+        changed[1:] |= sorted_codes[level][1:] != sorted_codes[level][:-1]
+        starts = np.flatnonzero(changed)
+        ends = np.r_[starts[1:], len(order)]
+        level_children = {}
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            prefix = tuple(uniques[i][sorted_codes[i][start]] for i in range(level))
+            value = uniques[level][sorted_codes[level][start]]
+            level_children.setdefault(prefix, {})[value] = (start, end)
+        children.append(level_children)
+
+    return FacetIndex(tuple(columns), order, children)
+
+
+def _blocks(facets, selections):
+    """(prefix, start, end) for every group matching `selections`, one entry per level.
+
+    Each selection is None for "All" or a collection of allowed values.
+    """
+    blocks = [((), 0, len(facets.order))]
+    for level, selected in enumerate(selections):
+        matching = []
+        for prefix, _, _ in blocks:
+            for value, (start, end) in facets.children[level].get(prefix, {}).items():
+                if selected is None or value in selected:
+                    matching.append((prefix + (value,), start, end))
+        blocks = matching
+    return blocks
+
+
+def options(facets, selections):
+    """Sorted values available at the level below `selections`."""
+    level = len(selections)
+    values = set()
+    for prefix, _, _ in _blocks(facets, selections):
+        values.update(facets.children[level].get(prefix, {}))
+    return sorted(values)
+
+
+def rows(facets, selections):
+    """Row positions, in frame order, of the rows matching `selections`."""
+    blocks = _blocks(facets, selections)
+    if not blocks:
+        return np.empty(0, dtype=np.int64)
+    return np.sort(np.concatenate([facets.order[start:end] for _, start, end in blocks]))
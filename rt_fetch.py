@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+from config import get_setting
+
+# Point at a local replay_server.py with GTFS_RT_BASE_URL=http://localhost:8765/api/realtime/SEQ
+GTFS_RT_BASE_URL = get_setting("GTFS_RT_BASE_URL", "https://gtfsrt.api.translink.com.au/api/realtime/SEQ")
+SEQ_MODES = ("Bus", "Train", "Ferry", "Tram")
+VEHICLE_POSITIONS = "VehiclePositions"
+TRIP_UPDATES = "TripUpdates"
+TIMEOUT = 10
+MAX_WORKERS = 2 * len(SEQ_MODES)
+
+# One keep-alive session and worker pool per process, shared by every rerun and session
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS))
+_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS))
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="gtfs-rt-fetch")
+
+
+def feed_url(feed_type, mode="Bus", base_url=GTFS_RT_BASE_URL):
+    """Return the GTFS-RT URL for a feed type (VehiclePositions/TripUpdates) and mode."""
+    return f"{base_url}/{feed_type}/{mode}"
+
+
+def fetch(url):
+    """GET a feed over the shared keep-alive session; raises requests.RequestException."""
+    with tracing.span("fetch") as span:
+        response = _session.get(url, timeout=TIMEOUT)
+        response.raise_for_status()
+        span["payload_bytes"] = len(response.content)
+    return response.content
+
+
+def fetch_feeds(urls):
+    """Fetch several feeds concurrently.
+
+    `urls` maps any key to a URL. Returns (contents, errors): two dicts
+    keyed like `urls`, holding the response bytes or the exception for
+    each feed. Total latency is that of the slowest feed.
+    """
+    futures = {key: _executor.submit(fetch, url) for key, url in urls.items()}
+    contents, errors = {}, {}
+    for key, future in futures.items():
+        try:
+            contents[key] = future.result()
+        except requests.RequestException as e:
+            errors[key] = e
+    return contents, errors
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytz
+from google.transit import gtfs_realtime_pb2
+
+import regions
+import rt_fetch
+import rt_stop_updates
+import tracing
+
+BRISBANE_TZ = pytz.timezone('Australia/Brisbane')
+# Any of rt_fetch.SEQ_MODES; every mode's feeds are fetched concurrently
+FEED_MODES = ("Bus",)
+
+
+@tracing.traced("parse_vehicle_positions")
+def parse_vehicle_positions(content: bytes) -> pd.DataFrame:
+    """Decode a VehiclePositions feed straight into typed column arrays.
+
+    Timestamps stay as int64 epoch seconds (0 when absent); use
+    format_timestamps to render them for display.
+    """
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(content)
+
+    vehicles = [entity.vehicle for entity in feed.entity if entity.HasField("vehicle")]
+    n = len(vehicles)
+    trip_id = np.empty(n, dtype=object)
+    route_id = np.empty(n, dtype=object)
+    vehicle_id = np.empty(n, dtype=object)
+    stop_id = np.empty(n, dtype=object)
+    # Protobuf positions are 32-bit floats, so float32 loses nothing
+    lat = np.empty(n, dtype=np.float32)
+    lon = np.empty(n, dtype=np.float32)
+    stop_sequence = np.empty(n, dtype=np.int32)
+    current_status = np.empty(n, dtype=np.int8)
+    timestamp = np.empty(n, dtype=np.int64)
+
+    for i, v in enumerate(vehicles):
+        trip = v.trip
+        position = v.position
+        trip_id[i] = trip.trip_id
+        route_id[i] = trip.route_id
+        vehicle_id[i] = v.vehicle.label
+        lat[i] = position.latitude
+        lon[i] = position.longitude
+        stop_sequence[i] = v.current_stop_sequence
+        stop_id[i] = v.stop_id
+        current_status[i] = v.current_status
+        timestamp[i] = v.timestamp
+
+    return pd.DataFrame({
+        "trip_id": trip_id,
+        "route_id": route_id,
+        "vehicle_id": vehicle_id,
+        "lat": lat,
+        "lon": lon,
+        "stop_sequence": stop_sequence,
+        "stop_id": stop_id,
+        "current_status": current_status,
+        "timestamp": timestamp,
+    })
+
+
+def delay_status(delay):
+    """Label delays in seconds as Delayed (> 5 min late), Early (> 1 min early) or On Time."""
+    delay = np.asarray(delay)
+    return np.select([delay > 300, delay < -60], ["Delayed", "Early"], default="On Time").astype(object)
+
+
+def format_timestamps(timestamps, fmt='%Y-%m-%d %H:%M:%S %Z'):
+    """Render epoch-second timestamps in Brisbane time; 0 (absent) becomes "N/A"."""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    formatted = pd.to_datetime(timestamps, unit="s", utc=True).tz_convert(BRISBANE_TZ).strftime(fmt)
+    return np.where(timestamps > 0, np.asarray(formatted, dtype=object), "N/A")
+
+
+def build_live_snapshot(contents, modes=FEED_MODES) -> pd.DataFrame:
+    """Parse and merge fetched feeds, keyed (feed_type, mode), into one vehicle table."""
+    # A mode is only shown when both of its feeds arrived
+    modes = [
+        mode for mode in modes
+        if (rt_fetch.VEHICLE_POSITIONS, mode) in contents and (rt_fetch.TRIP_UPDATES, mode) in contents
+    ]
+    if not modes:
+        return pd.DataFrame()
+
+    vehicles_df = pd.concat(
+        [parse_vehicle_positions(contents[(rt_fetch.VEHICLE_POSITIONS, mode)]).assign(mode=mode) for mode in modes],
+        ignore_index=True,
+    )
+    if vehicles_df.empty:
+        return pd.DataFrame()
+
+    updates = rt_stop_updates.parse_stop_time_updates(contents[(rt_fetch.TRIP_UPDATES, mode)] for mode in modes)
+
+    with tracing.span("merge"):
+        # Delay at the stop each vehicle is at or heading to; 0 where the feed has no prediction
+        live_data = vehicles_df
+        delay = rt_stop_updates.delays_at(updates, live_data["trip_id"].to_numpy(), live_data["stop_sequence"].to_numpy())
+        live_data["delay"] = np.nan_to_num(delay).astype(np.int32)
+        live_data["status"] = delay_status(live_data["delay"])
+        live_data["route_name"] = live_data["route_id"].str.split('-').str[0]
+        live_data["region"] = regions.classify_points(live_data["lat"], live_data["lon"])
+    return live_data
+
+
+def fetch_live_snapshot(modes=FEED_MODES):
+    """Fetch every feed for `modes` concurrently and build the vehicle table.
+
+    Returns (DataFrame, errors) where errors lists the fetch exceptions.
+    """
+    urls = {
+        (feed_type, mode): rt_fetch.feed_url(feed_type, mode)
+        for mode in modes
+        for feed_type in (rt_fetch.VEHICLE_POSITIONS, rt_fetch.TRIP_UPDATES)
+    }
+    contents, errors = rt_fetch.fetch_feeds(urls)
+    return build_live_snapshot(contents, modes), list(errors.values())
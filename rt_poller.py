@@ -0,0 +1,129 @@
+"""Poll the GTFS-RT feeds on a fixed schedule and publish the latest snapshot.
+
+Run alongside the dashboard:
+
+    python rt_poller.py --interval 30
+
+Every dashboard session then memory-maps the published snapshot instead of
+fetching and parsing the feeds itself. Add --archive to keep every poll in
+the rt_archive store, or replay an archived range at ten times real speed:
+
+    python rt_poller.py --replay-start 2025-01-01T07:00 --replay-end 2025-01-01T09:00 --speed 10
+"""
+import argparse
+import logging
+import math
+import os
+import time
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import rt_archive
+import rt_pipeline
+
+SNAPSHOT_PATH = os.environ.get("RT_SNAPSHOT_PATH", os.path.join(".rt_snapshot", "live.arrow"))
+POLL_INTERVAL_SECONDS = 30
+
+logger = logging.getLogger("rt_poller")
+
+
+def write_snapshot(df, fetched_at, path=SNAPSHOT_PATH):
+    """Atomically replace the published snapshot with `df`."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"fetched_at"] = str(fetched_at.timestamp()).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(max_age_seconds, path=SNAPSHOT_PATH):
+    """Return (DataFrame, fetched_at) for the published snapshot, or None if missing or stale."""
+    try:
+        table = feather.read_table(path, memory_map=True)
+        fetched_at = datetime.fromtimestamp(float(table.schema.metadata[b"fetched_at"]), rt_pipeline.BRISBANE_TZ)
+    except (OSError, pa.ArrowInvalid, KeyError, TypeError):
+        return None
+
+    if (datetime.now(rt_pipeline.BRISBANE_TZ) - fetched_at).total_seconds() > max_age_seconds:
+        return None
+    return table.to_pandas(), fetched_at
+
+
+def poll_once(modes, path=SNAPSHOT_PATH, archiver=None):
+    """Fetch, parse and publish one snapshot; keeps the previous one if every feed failed."""
+    started = time.perf_counter()
+    df, errors = rt_pipeline.fetch_live_snapshot(modes)
+    for error in errors:
+        logger.warning("Fetch failed: %s", error)
+    if df.empty:
+        logger.warning("No vehicles in this poll; keeping the previous snapshot")
+        return
+
+    fetched_at = datetime.now(rt_pipeline.BRISBANE_TZ)
+    write_snapshot(df, fetched_at, path)
+    logger.info("Published %d vehicles in %.2fs", len(df), time.perf_counter() - started)
+    if archiver is not None:
+        logger.info("Archived %d new fixes", archiver.append(df, fetched_at))
+
+
+def replay(start, end, speed, path=SNAPSHOT_PATH, archive_dir=rt_archive.ARCHIVE_DIR):
+    """Publish archived snapshots from [start, end) in place of live polls."""
+    for snapshot, fetched_at in rt_archive.replay(start, end, speed, archive_dir):
+        # Published as if fetched now, so the dashboard treats it as fresh
+        write_snapshot(snapshot, datetime.now(rt_pipeline.BRISBANE_TZ), path)
+        logger.info("Replayed %s: %d vehicles", fetched_at.strftime('%Y-%m-%d %H:%M:%S'), len(snapshot))
+
+
+def _brisbane_time(value):
+    return rt_pipeline.BRISBANE_TZ.localize(datetime.fromisoformat(value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll GTFS-RT feeds and publish the latest snapshot.")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL_SECONDS, help="seconds between polls")
+    parser.add_argument("--modes", nargs="+", default=list(rt_pipeline.FEED_MODES))
+    parser.add_argument("--path", default=SNAPSHOT_PATH)
+    parser.add_argument("--once", action="store_true", help="poll once and exit")
+    parser.add_argument("--archive", action="store_true", help="also append every poll to the archive")
+    parser.add_argument("--archive-dir", default=rt_archive.ARCHIVE_DIR)
+    parser.add_argument("--replay-start", type=_brisbane_time, help="replay the archive from this Brisbane time (ISO format)")
+    parser.add_argument("--replay-end", type=_brisbane_time, help="end of the replayed range")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed as a multiple of real time; 0 for no pauses")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.replay_start or args.replay_end:
+        if not (args.replay_start and args.replay_end):
+            parser.error("--replay-start and --replay-end go together")
+        replay(args.replay_start, args.replay_end, args.speed, args.path, args.archive_dir)
+        return
+
+    archiver = rt_archive.Archiver(args.archive_dir) if args.archive else None
+
+    # Schedule against a fixed clock so slow polls don't drift the cadence
+    next_run = time.monotonic()
+    while True:
+        try:
+            poll_once(args.modes, args.path, archiver)
+        except Exception:
+            logger.exception("Poll failed")
+        if args.once:
+            return
+        # Skip missed slots rather than polling back to back after a slow poll:
+        # wait for the next slot boundary on the fixed clock
+        next_run += args.interval
+        now = time.monotonic()
+        if args.interval > 0 and next_run < now:
+            next_run += math.ceil((now - next_run) / args.interval) * args.interval
+        time.sleep(max(0.0, next_run - time.monotonic()))
+
+
+if __name__ == "__main__":
+    main()
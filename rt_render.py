@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+# RGB per delay status, matching the folium marker colours
+STATUS_COLORS = {
+    "On Time": (44, 160, 44),
+    "Delayed": (214, 39, 40),
+    "Early": (31, 119, 180),
+}
+TRAIL_COLOR = [0, 0, 255, 160]
+
+TOOLTIP = {
+    "html": (
+        "<b>Route:</b> {route_name} ({route_id})<br/>"
+        "<b>Vehicle ID:</b> {vehicle_id}<br/>"
+        "<b>Status:</b> {status}<br/>"
+        "<b>Delay:</b> {delay} seconds<br/>"
+        "<b>Last Update:</b> {last_update}"
+    )
+}
+
+
+def vehicle_data(df):
+    """Reduce the vehicle table to the columns the deck layers read, with colours as r/g/b columns."""
+    palette = np.array(list(STATUS_COLORS.values()), dtype=np.uint8)
+    codes = pd.Categorical(df["status"], categories=list(STATUS_COLORS)).codes
+    # Unknown statuses draw as On Time, like the folium default
+    colors = palette[np.maximum(codes, 0)]
+    return pd.DataFrame({
+        "lon": df["lon"].to_numpy(),
+        "lat": df["lat"].to_numpy(),
+        "r": colors[:, 0],
+        "g": colors[:, 1],
+        "b": colors[:, 2],
+        "vehicle_id": df["vehicle_id"].to_numpy(),
+        "route_id": df["route_id"].to_numpy(),
+        "route_name": df["route_name"].to_numpy(),
+        "status": df["status"].to_numpy(),
+        "delay": df["delay"].to_numpy(),
+        "last_update": df["last_update"].to_numpy(),
+        "label": "vehicle: " + df["vehicle_id"].astype(str) + " on stop_seq: " + df["stop_sequence"].astype(str),
+    })
+
+
+def trail_data(trails):
+    """Turn rt_tracker trails ({vehicle_id: [[lat, lon], ...]}) into PathLayer rows of [lon, lat] paths."""
+    return pd.DataFrame({
+        "vehicle_id": list(trails),
+        "path": [[[lon, lat] for lat, lon in trail] for trail in trails.values()],
+    })
+
+
+def vehicle_deck(df, trails, show_labels=True) -> pdk.Deck:
+    """Build one deck.gl map for all vehicles: trails, status-coloured points and optional labels.
+
+    Each layer is a single data array styled per row on the GPU, and the
+    layer ids are stable, so a refresh only ships new data to the browser.
+    """
+    vehicles = vehicle_data(df)
+    layers = [
+        pdk.Layer(
+            "PathLayer",
+            id="vehicle-trails",
+            data=trail_data(trails),
+            get_path="path",
+            get_color=TRAIL_COLOR,
+            width_min_pixels=3,
+        ),
+        pdk.Layer(
+            "ScatterplotLayer",
+            id="vehicles",
+            data=vehicles,
+            get_position=["lon", "lat"],
+            get_fill_color="[r, g, b]",
+            get_line_color=[255, 255, 255],
+            stroked=True,
+            radius_min_pixels=5,
+            radius_max_pixels=12,
+            get_radius=30,
+            pickable=True,
+        ),
+    ]
+    if show_labels:
+        layers.append(pdk.Layer(
+            "TextLayer",
+            id="vehicle-labels",
+            data=vehicles,
+            get_position=["lon", "lat"],
+            get_text="label",
+            get_color="[r, g, b]",
+            get_size=12,
+            get_pixel_offset=[0, -18],
+            background=True,
+            get_background_color=[245, 245, 245],
+        ))
+
+    view_state = pdk.ViewState(
+        latitude=float(vehicles["lat"].mean()),
+        longitude=float(vehicles["lon"].mean()),
+        zoom=12,
+    )
+    return pdk.Deck(
+        layers=layers,
+        initial_view_state=view_state,
+        map_provider="carto",
+        map_style="light",
+        tooltip=TOOLTIP,
+    )
+
+
+def points_geojson(df, property_columns):
+    """One GeoJSON FeatureCollection of Points for every row of `df` (lat/lon columns)."""
+    coordinates = np.column_stack([df["lon"].to_numpy(np.float64), df["lat"].to_numpy(np.float64)]).tolist()
+    properties = df[property_columns].astype(object).where(df[property_columns].notna(), None).to_dict("records")
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": point}, "properties": props}
+            for point, props in zip(coordinates, properties)
+        ],
+    }
+
+
+def shapes_geojson(shapes_df):
+    """One GeoJSON FeatureCollection with a LineString per shape_id.
+
+    `shapes_df` must be ordered by shape_id and shape_pt_sequence, as
+    gtfs_queries returns it; the coordinates are converted in one pass
+    and split at shape boundaries rather than grouped per shape.
+    """
+    shape_ids = shapes_df["shape_id"].to_numpy()
+    coordinates = np.column_stack([
+        shapes_df["shape_pt_lon"].to_numpy(np.float64),
+        shapes_df["shape_pt_lat"].to_numpy(np.float64),
+    ]).tolist()
+    starts = np.flatnonzero(np.r_[True, shape_ids[1:] != shape_ids[:-1]]) if len(shape_ids) else np.empty(0, int)
+    ends = np.r_[starts[1:], len(shape_ids)]
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": coordinates[start:end]},
+                "properties": {"shape_id": str(shape_ids[start])},
+            }
+            for start, end in zip(starts, ends)
+            if end - start >= 2
+        ],
+    }
@@ -0,0 +1,125 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from google.transit import gtfs_realtime_pb2
+
+import tracing
+
+# Sentinel for delays the feed did not provide
+MISSING_DELAY = np.iinfo(np.int32).min
+# StopTimeUpdates that only carry a stop_id sort before every real sequence
+MISSING_SEQUENCE = -1
+
+
+class StopTimeUpdates(NamedTuple):
+    """Every StopTimeUpdate in a TripUpdates feed, sorted by (trip, stop_sequence)."""
+
+    # Distinct trip_ids; trip_code indexes into this array
+    trip_ids: np.ndarray
+    trip_code: np.ndarray
+    stop_sequence: np.ndarray
+    stop_id: np.ndarray
+    arrival_delay: np.ndarray
+    departure_delay: np.ndarray
+    arrival_time: np.ndarray
+    departure_time: np.ndarray
+    # (trip_code << 32) + stop_sequence + 1, ascending; the lookup index
+    keys: np.ndarray
+
+
+def _keys(trip_code, stop_sequence):
+    return (trip_code.astype(np.int64) << 32) + (stop_sequence.astype(np.int64) + 1)
+
+
+@tracing.traced("parse_stop_time_updates")
+def parse_stop_time_updates(contents) -> StopTimeUpdates:
+    """Decode every StopTimeUpdate from one or more TripUpdates feeds into sorted arrays."""
+    trip_updates = []
+    for content in contents:
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.ParseFromString(content)
+        trip_updates.extend(entity.trip_update for entity in feed.entity if entity.HasField("trip_update"))
+
+    n = sum(len(tu.stop_time_update) for tu in trip_updates)
+    trip_code = np.empty(n, dtype=np.int32)
+    stop_sequence = np.empty(n, dtype=np.int32)
+    stop_id = np.empty(n, dtype=object)
+    arrival_delay = np.full(n, MISSING_DELAY, dtype=np.int32)
+    departure_delay = np.full(n, MISSING_DELAY, dtype=np.int32)
+    arrival_time = np.zeros(n, dtype=np.int64)
+    departure_time = np.zeros(n, dtype=np.int64)
+
+    codes = {}
+    i = 0
+    for tu in trip_updates:
+        code = codes.setdefault(tu.trip.trip_id, len(codes))
+        for stu in tu.stop_time_update:
+            trip_code[i] = code
+            stop_sequence[i] = stu.stop_sequence if stu.HasField("stop_sequence") else MISSING_SEQUENCE
+            stop_id[i] = stu.stop_id
+            if stu.HasField("arrival"):
+                if stu.arrival.HasField("delay"):
+                    arrival_delay[i] = stu.arrival.delay
+                arrival_time[i] = stu.arrival.time
+            if stu.HasField("departure"):
+                if stu.departure.HasField("delay"):
+                    departure_delay[i] = stu.departure.delay
+                departure_time[i] = stu.departure.time
+            i += 1
+
+    keys = _keys(trip_code, stop_sequence)
+    order = np.argsort(keys, kind="stable")
+    return StopTimeUpdates(
+        np.array(list(codes), dtype=object),
+        trip_code[order],
+        stop_sequence[order],
+        stop_id[order],
+        arrival_delay[order],
+        departure_delay[order],
+        arrival_time[order],
+        departure_time[order],
+        keys[order],
+    )
+
+
+def lookup(updates, trip_ids, stop_sequences):
+    """Return, per (trip_id, stop_sequence), the row of the StopTimeUpdate that applies there.
+
+    Following GTFS-RT propagation, that is the last update at or before the
+    stop; stops before a trip's first update fall back to that first
+    update. Rows are -1 where the trip has no updates.
+    """
+    codes = pd.Index(updates.trip_ids).get_indexer(np.asarray(trip_ids, dtype=object))
+    if not len(updates.keys):
+        return np.full(len(codes), -1, dtype=np.int64)
+
+    known = codes >= 0
+    codes = np.where(known, codes, 0).astype(np.int64)
+    sequences = np.asarray(stop_sequences, dtype=np.int64)
+    last_row = len(updates.keys) - 1
+
+    position = np.searchsorted(updates.keys, _keys(codes, sequences), side="right") - 1
+    at_or_before = (position >= 0) & (updates.trip_code[np.maximum(position, 0)] == codes)
+
+    first = np.searchsorted(updates.keys, codes << 32, side="left")
+    has_first = (first <= last_row) & (updates.trip_code[np.minimum(first, last_row)] == codes)
+
+    rows = np.where(at_or_before, position, np.where(has_first, first, -1))
+    return np.where(known, rows, -1)
+
+
+def delays_at(updates, trip_ids, stop_sequences):
+    """Vectorised predicted delay in seconds at each vehicle's stop; NaN where unknown.
+
+    Uses the arrival delay, falling back to the departure delay.
+    """
+    rows = lookup(updates, trip_ids, stop_sequences)
+    delay = np.full(len(rows), np.nan)
+    found = rows >= 0
+    arrival = updates.arrival_delay[rows[found]]
+    departure = updates.departure_delay[rows[found]]
+    chosen = np.where(arrival != MISSING_DELAY, arrival, departure).astype(np.float64)
+    chosen[chosen == MISSING_DELAY] = np.nan
+    delay[found] = chosen
+    return delay
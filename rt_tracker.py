@@ -0,0 +1,109 @@
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+# Positions kept per vehicle for drawing trails
+TRAIL_LENGTH = 5
+
+
+class TrackerUpdate(NamedTuple):
+    """vehicle_ids that moved, appeared or disappeared in one snapshot."""
+
+    moved: np.ndarray
+    appeared: np.ndarray
+    disappeared: np.ndarray
+
+
+class VehicleTracker:
+    """Vehicle-keyed ring buffers of the last `history` distinct positions.
+
+    One tracker is shared by every session: apply each snapshot once with
+    update() and read trails back with trails(). Snapshots are identified
+    by their fetch time, so sessions rerunning on the same snapshot, or an
+    older one, don't advance the history.
+    """
+
+    def __init__(self, history=TRAIL_LENGTH, capacity=1024):
+        self.history = history
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._free = []
+        # Slots ever handed out; freed ones are reused before this grows
+        self._allocated = 0
+        self._positions = np.zeros((capacity, history, 2), dtype=np.float32)
+        self._count = np.zeros(capacity, dtype=np.int32)
+        self._head = np.zeros(capacity, dtype=np.int32)
+        self._fetched_at = None
+        self._last = TrackerUpdate(*(np.empty(0, dtype=object) for _ in range(3)))
+
+    def _grow(self, needed):
+        capacity = len(self._count)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, 2 * capacity)
+        positions = np.zeros((new_capacity, self.history, 2), dtype=np.float32)
+        positions[:capacity] = self._positions
+        self._positions = positions
+        self._count = np.concatenate([self._count, np.zeros(new_capacity - capacity, dtype=np.int32)])
+        self._head = np.concatenate([self._head, np.zeros(new_capacity - capacity, dtype=np.int32)])
+
+    def update(self, df, fetched_at):
+        """Apply a snapshot (vehicle_id, lat, lon) and return what changed since the last one."""
+        with self._lock:
+            if self._fetched_at is not None and fetched_at <= self._fetched_at:
+                return self._last
+
+            df = df.drop_duplicates("vehicle_id", keep="last")
+            ids = df["vehicle_id"].to_numpy(dtype=object)
+            lat = df["lat"].to_numpy(dtype=np.float32)
+            lon = df["lon"].to_numpy(dtype=np.float32)
+
+            current = set(ids)
+            disappeared = np.array([v for v in self._slots if v not in current], dtype=object)
+            for vehicle_id in disappeared:
+                slot = self._slots.pop(vehicle_id)
+                self._count[slot] = 0
+                self._head[slot] = 0
+                self._free.append(slot)
+
+            slots = np.fromiter((self._slots.get(v, -1) for v in ids), dtype=np.int64, count=len(ids))
+            new = slots < 0
+            appeared = ids[new]
+            self._grow(self._allocated + max(0, len(appeared) - len(self._free)))
+            for i in np.flatnonzero(new):
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    slot = self._allocated
+                    self._allocated += 1
+                self._slots[ids[i]] = slot
+                slots[i] = slot
+
+            # Only distinct positions go into the ring, so trails don't fill with repeats
+            latest = self._positions[slots, (self._head[slots] - 1) % self.history]
+            moved = ~new & ((latest[:, 0] != lat) | (latest[:, 1] != lon))
+            push = slots[new | moved]
+            self._positions[push, self._head[push]] = np.column_stack([lat, lon])[new | moved]
+            self._head[push] = (self._head[push] + 1) % self.history
+            self._count[push] = np.minimum(self._count[push] + 1, self.history)
+
+            self._fetched_at = fetched_at
+            self._last = TrackerUpdate(ids[moved], appeared, disappeared)
+            return self._last
+
+    def trails(self, vehicle_ids):
+        """Return {vehicle_id: [[lat, lon], ...]} oldest first, for vehicles with two or more positions."""
+        with self._lock:
+            trails = {}
+            for vehicle_id in vehicle_ids:
+                slot = self._slots.get(vehicle_id)
+                if slot is None or self._count[slot] < 2:
+                    continue
+                count = self._count[slot]
+                order = (self._head[slot] - count + np.arange(count)) % self.history
+                trails[vehicle_id] = self._positions[slot, order].tolist()
+            return trails
+
+    def __len__(self):
+        return len(self._slots)
@@ -0,0 +1,160 @@
+from typing import NamedTuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_000
+# Grid cell edge; a few hundred stops or vehicles per cell at most in SEQ
+CELL_SIZE_M = 500
+# Cells are widened past CELL_SIZE_M when the points span too large an area, e.g. a stray (0, 0) fix
+MAX_CELLS = 1_000_000
+
+
+class GridIndex(NamedTuple):
+    """Points bucketed into a regular grid on a local equirectangular projection.
+
+    Cells are numbered row-major (cell_y * n_x + cell_x) and `order` lists
+    point positions sorted by cell, so each grid row of a query window is
+    one contiguous slice of `order`.
+    """
+
+    cos_lat0: float
+    cell_size: float
+    x0: float
+    y0: float
+    n_x: int
+    n_y: int
+    # Point positions sorted by cell
+    order: np.ndarray
+    # order[offsets[c]:offsets[c + 1]] are the points in cell c
+    offsets: np.ndarray
+    # Projected point coordinates in metres, in input order
+    x: np.ndarray
+    y: np.ndarray
+
+
+def project(lat, lon, cos_lat0):
+    """Equirectangular projection to metres around the latitude whose cosine is `cos_lat0`."""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    return lon * EARTH_RADIUS_M * cos_lat0, lat * EARTH_RADIUS_M
+
+
+def build_grid_index(lat, lon, cell_size=CELL_SIZE_M) -> GridIndex:
+    """Index points by grid cell; positions returned by queries refer to the input order.
+
+    Points with a non-finite coordinate are left out of the index.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    indexed = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    cos_lat0 = float(np.cos(np.radians(lat[indexed].mean()))) if len(indexed) else 1.0
+    x, y = project(lat, lon, cos_lat0)
+    ix, iy = x[indexed], y[indexed]
+
+    x0 = float(ix.min()) if len(ix) else 0.0
+    y0 = float(iy.min()) if len(iy) else 0.0
+    if len(ix):
+        area = (ix.max() - x0 + cell_size) * (iy.max() - y0 + cell_size)
+        cell_size = max(cell_size, float(np.sqrt(area / MAX_CELLS)))
+    cell_x = ((ix - x0) // cell_size).astype(np.int64)
+    cell_y = ((iy - y0) // cell_size).astype(np.int64)
+    n_x = int(cell_x.max()) + 1 if len(ix) else 1
+    n_y = int(cell_y.max()) + 1 if len(iy) else 1
+
+    cells = cell_y * n_x + cell_x
+    sort = np.argsort(cells, kind="stable")
+    order = indexed[sort]
+    cells = cells[sort]
+    offsets = np.searchsorted(cells, np.arange(n_x * n_y + 1))
+    return GridIndex(cos_lat0, float(cell_size), x0, y0, n_x, n_y, order, offsets, x, y)
+
+
+def _cell_of(index, x, y):
+    return int((x - index.x0) // index.cell_size), int((y - index.y0) // index.cell_size)
+
+
+def _candidates(index, cx0, cx1, cy0, cy1):
+    """Positions of every point in the cell window [cx0, cx1] x [cy0, cy1]."""
+    cx0, cx1 = max(cx0, 0), min(cx1, index.n_x - 1)
+    cy0, cy1 = max(cy0, 0), min(cy1, index.n_y - 1)
+    if cx0 > cx1 or cy0 > cy1:
+        return np.empty(0, dtype=np.int64)
+    rows = np.arange(cy0, cy1 + 1) * index.n_x
+    starts = index.offsets[rows + cx0]
+    ends = index.offsets[rows + cx1 + 1]
+    return np.concatenate([index.order[start:end] for start, end in zip(starts, ends)])
+
+
+def query_bbox(index, south, west, north, east):
+    """Positions of the points inside a lat/lon bounding box, ascending."""
+    left, right = project(0, [west, east], index.cos_lat0)[0]
+    bottom, top = project([south, north], 0, index.cos_lat0)[1]
+    cx0, cy0 = _cell_of(index, left, bottom)
+    cx1, cy1 = _cell_of(index, right, top)
+    positions = _candidates(index, cx0, cx1, cy0, cy1)
+    x, y = index.x[positions], index.y[positions]
+    inside = (x >= left) & (x <= right) & (y >= bottom) & (y <= top)
+    return np.sort(positions[inside])
+
+
+def query_radius(index, lat, lon, radius_m):
+    """(positions, distances in metres) of the points within `radius_m`, nearest first."""
+    qx, qy = project(lat, lon, index.cos_lat0)
+    cx0, cy0 = _cell_of(index, qx - radius_m, qy - radius_m)
+    cx1, cy1 = _cell_of(index, qx + radius_m, qy + radius_m)
+    positions = _candidates(index, cx0, cx1, cy0, cy1)
+    distances = np.hypot(index.x[positions] - qx, index.y[positions] - qy)
+    within = distances <= radius_m
+    positions, distances = positions[within], distances[within]
+    order = np.argsort(distances, kind="stable")
+    return positions[order], distances[order]
+
+
+def knn(index, lat, lon, k=1):
+    """(positions, distances in metres) of the `k` points nearest to (lat, lon), nearest first.
+
+    Searches square rings of cells outward until the k-th candidate is
+    closer than any point outside the searched window could be.
+    """
+    qx, qy = project(lat, lon, index.cos_lat0)
+    cx, cy = _cell_of(index, qx, qy)
+    k = min(k, len(index.order))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    # Queries outside the grid start from the first ring that reaches it
+    ring = max(0, -cx, cx - (index.n_x - 1), -cy, cy - (index.n_y - 1))
+    while True:
+        positions = _candidates(index, cx - ring, cx + ring, cy - ring, cy + ring)
+        distances = np.hypot(index.x[positions] - qx, index.y[positions] - qy)
+        covers_grid = cx - ring <= 0 and cy - ring <= 0 and cx + ring >= index.n_x - 1 and cy + ring >= index.n_y - 1
+        if len(positions) >= k:
+            nearest = np.argsort(distances, kind="stable")[:k]
+            # Distance from the query to the window edge; nothing outside is closer
+            left = index.x0 + (cx - ring) * index.cell_size
+            bottom = index.y0 + (cy - ring) * index.cell_size
+            right = left + (2 * ring + 1) * index.cell_size
+            top = bottom + (2 * ring + 1) * index.cell_size
+            covered = min(qx - left, right - qx, qy - bottom, top - qy)
+            if covers_grid or distances[nearest[-1]] <= covered:
+                return positions[nearest], distances[nearest]
+        if covers_grid:
+            return positions[:0], distances[:0]
+        ring += 1
+
+
+def nearest(index, lat, lon):
+    """For arrays of query points, the position of and distance to the nearest indexed point.
+
+    Runs knn(k=1) once per query point, so it suits small batches only.
+    Positions are -1 and distances NaN when the index is empty.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    positions = np.full(len(lat), -1, dtype=np.int64)
+    distances = np.full(len(lat), np.nan)
+    if not len(index.order):
+        return positions, distances
+    for i in range(len(lat)):
+        found, distance = knn(index, lat[i], lon[i], 1)
+        positions[i], distances[i] = found[0], distance[0]
+    return positions, distances
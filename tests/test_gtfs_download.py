@@ -0,0 +1,129 @@
+import hashlib
+import json
+
+import pytest
+
+import gtfs_download
+
+URL = "https://example.com/gtfs.zip"
+BODY = bytes(range(256)) * 40
+ETAG = '"v1"'
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = {"Content-Length": str(len(body)), **(headers or {})}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise gtfs_download.requests.HTTPError(str(self.status_code))
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Queue responses for requests.get and record the headers of every request."""
+    responses, requests_seen = [], []
+
+    def get(url, headers=None, **kwargs):
+        requests_seen.append(dict(headers or {}))
+        return responses.pop(0)
+
+    monkeypatch.setattr(gtfs_download.requests, "get", get)
+    return responses, requests_seen
+
+
+def full_response():
+    return FakeResponse(200, BODY, {"ETag": ETAG})
+
+
+def write_partial(dest_path, size):
+    part_path = dest_path + ".part"
+    with open(part_path, "wb") as f:
+        f.write(BODY[:size])
+    with open(part_path + ".json", "w") as f:
+        json.dump({"url": URL, "etag": ETAG, "last_modified": None}, f)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_not_modified_after_full_download(server, tmp_path):
+    responses, seen = server
+    dest_path = str(tmp_path / "feed.zip")
+    responses.append(full_response())
+    first = gtfs_download.download_feed(URL, dest_path)
+    assert not first.not_modified
+    assert first.sha256 == hashlib.sha256(BODY).hexdigest()
+
+    responses.append(FakeResponse(304))
+    second = gtfs_download.download_feed(URL, dest_path)
+    assert second.not_modified
+    assert second.sha256 == first.sha256
+    assert seen[1]["If-None-Match"] == ETAG
+    assert read(dest_path) == BODY
+
+
+def test_resumes_partial_download(server, tmp_path):
+    responses, seen = server
+    dest_path = str(tmp_path / "feed.zip")
+    write_partial(dest_path, 1000)
+    responses.append(FakeResponse(206, BODY[1000:], {"ETag": ETAG, "Content-Range": f"bytes 1000-{len(BODY) - 1}/{len(BODY)}"}))
+
+    result = gtfs_download.download_feed(URL, dest_path)
+    assert seen[0]["Range"] == "bytes=1000-"
+    assert seen[0]["If-Range"] == ETAG
+    assert read(dest_path) == BODY
+    assert result.sha256 == hashlib.sha256(BODY).hexdigest()
+
+
+def test_range_not_satisfiable_restarts(server, tmp_path):
+    responses, seen = server
+    dest_path = str(tmp_path / "feed.zip")
+    write_partial(dest_path, 1000)
+    responses.extend([FakeResponse(416), full_response()])
+
+    gtfs_download.download_feed(URL, dest_path)
+    assert "Range" in seen[0]
+    assert "Range" not in seen[1]
+    assert read(dest_path) == BODY
+
+
+def test_mismatched_partial_content_restarts(server, tmp_path):
+    responses, seen = server
+    dest_path = str(tmp_path / "feed.zip")
+    write_partial(dest_path, 1000)
+    # A different range than requested must not be installed as the feed
+    responses.extend([
+        FakeResponse(206, BODY[:500], {"ETag": ETAG, "Content-Range": f"bytes 0-499/{len(BODY)}"}),
+        full_response(),
+    ])
+
+    gtfs_download.download_feed(URL, dest_path)
+    assert "Range" not in seen[1]
+    assert read(dest_path) == BODY
+
+
+def test_loaded_marker_follows_sha256(server, tmp_path):
+    responses, _ = server
+    dest_path = str(tmp_path / "feed.zip")
+    responses.append(full_response())
+    result = gtfs_download.download_feed(URL, dest_path)
+    assert not gtfs_download.already_loaded(result)
+
+    gtfs_download.mark_loaded(result)
+    assert gtfs_download.already_loaded(result)
+    assert not gtfs_download.already_loaded(result._replace(sha256="0" * 64))
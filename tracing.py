@@ -0,0 +1,148 @@
+"""Lightweight, process-wide timing of the dashboard's hot paths.
+
+Wrap a stage with the `span` context manager or the `traced` decorator;
+latencies go into fixed-bucket histograms alongside payload sizes and
+cache hit counts, exported with to_json() or to_prometheus().
+"""
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Histogram upper bounds in seconds, as in Prometheus' default buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_stages = {}
+_caches = {}
+# Names of caches that missed in this thread, read back by cached_call
+_local = threading.local()
+
+
+def _new_stage():
+    return {"counts": [0] * (len(BUCKETS) + 1), "count": 0, "sum": 0.0, "max": 0.0, "payload_bytes": 0}
+
+
+def observe(name, seconds, payload_bytes=0):
+    """Record one run of stage `name`."""
+    with _lock:
+        stage = _stages.setdefault(name, _new_stage())
+        stage["counts"][bisect_left(BUCKETS, seconds)] += 1
+        stage["count"] += 1
+        stage["sum"] += seconds
+        stage["max"] = max(stage["max"], seconds)
+        stage["payload_bytes"] += payload_bytes
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as stage `name`.
+
+    Set info["payload_bytes"] on the yielded dict to record its size.
+    """
+    info = {"payload_bytes": 0}
+    started = time.perf_counter()
+    try:
+        yield info
+    finally:
+        observe(name, time.perf_counter() - started, info["payload_bytes"])
+
+
+def traced(name):
+    """Decorator form of span()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(name, hit):
+    """Count a hit or miss of cache `name`."""
+    with _lock:
+        cache = _caches.setdefault(name, {"hits": 0, "misses": 0})
+        cache["hits" if hit else "misses"] += 1
+    if not hit:
+        _missed().add(name)
+
+
+def _missed():
+    if not hasattr(_local, "missed"):
+        _local.missed = set()
+    return _local.missed
+
+
+def cached_call(name, func, *args, **kwargs):
+    """Call a Streamlit-cached `func` and count whether it was served from cache.
+
+    `func` must call record_cache(name, hit=False) in its body, which only
+    runs on a miss; a call that records no miss in this thread is counted
+    as a hit, so misses in other sessions' threads don't count here.
+    """
+    missed = _missed()
+    missed.discard(name)
+    result = func(*args, **kwargs)
+    if name in missed:
+        missed.discard(name)
+    else:
+        record_cache(name, hit=True)
+    return result
+
+
+def snapshot():
+    """A copy of every stage and cache counter, with derived means and hit rates."""
+    with _lock:
+        stages = {name: dict(stage, counts=list(stage["counts"])) for name, stage in _stages.items()}
+        caches = {name: dict(cache) for name, cache in _caches.items()}
+    for stage in stages.values():
+        stage["mean"] = stage["sum"] / stage["count"] if stage["count"] else 0.0
+    for cache in caches.values():
+        total = cache["hits"] + cache["misses"]
+        cache["hit_rate"] = cache["hits"] / total if total else 0.0
+    return {"buckets": list(BUCKETS), "stages": stages, "caches": caches}
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _caches.clear()
+
+
+def to_json():
+    return json.dumps(snapshot(), indent=2, sort_keys=True)
+
+
+def to_prometheus():
+    """Render the counters in the Prometheus text exposition format."""
+    data = snapshot()
+    lines = [
+        "# HELP gtfs_stage_seconds Time spent in each dashboard stage.",
+        "# TYPE gtfs_stage_seconds histogram",
+    ]
+    for name, stage in sorted(data["stages"].items()):
+        cumulative = 0
+        for bound, count in zip([*BUCKETS, "+Inf"], stage["counts"]):
+            cumulative += count
+            lines.append(f'gtfs_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'gtfs_stage_seconds_sum{{stage="{name}"}} {stage["sum"]}')
+        lines.append(f'gtfs_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+
+    lines += [
+        "# HELP gtfs_stage_payload_bytes_total Bytes handled by each stage.",
+        "# TYPE gtfs_stage_payload_bytes_total counter",
+    ]
+    for name, stage in sorted(data["stages"].items()):
+        lines.append(f'gtfs_stage_payload_bytes_total{{stage="{name}"}} {stage["payload_bytes"]}')
+
+    lines += [
+        "# HELP gtfs_cache_requests_total Cache lookups by result.",
+        "# TYPE gtfs_cache_requests_total counter",
+    ]
+    for name, cache in sorted(data["caches"].items()):
+        lines.append(f'gtfs_cache_requests_total{{cache="{name}",result="hit"}} {cache["hits"]}')
+        lines.append(f'gtfs_cache_requests_total{{cache="{name}",result="miss"}} {cache["misses"]}')
+    return "\n".join(lines) + "\n"